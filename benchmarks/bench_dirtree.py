@@ -0,0 +1,60 @@
+"""Time `ascii_tree.renderable_dir_tree` on a synthetic directory tree.
+
+Usage:
+    python benchmarks/bench_dirtree.py [--files N] [--per-dir N] [--path DIR]
+
+The fixture is created under a temporary directory (or under --path, where it
+is kept and reused by later runs).  Run it against two checkouts (e.g. with
+PYTHONPATH pointing at each `src` directory) to compare implementations.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import ascii_tree  # noqa: E402
+from trees import make_dir_fixture  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--per-dir", type=int, default=1_000)
+    parser.add_argument("--path", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.path:
+        root = Path(args.path)
+        cleanup = False
+    else:
+        root = Path(tempfile.mkdtemp(prefix="ascii_tree_bench_"))
+        cleanup = True
+
+    try:
+        start = time.perf_counter()
+        make_dir_fixture(root, args.files, args.per_dir)
+        print(f"fixture    {args.files} files in {root} "
+              f"({time.perf_counter() - start:.1f} s to create/verify)")
+
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            ascii_tree.renderable_dir_tree(root)
+            best = min(best, time.perf_counter() - start)
+        print(f"dir walk   best={best * 1000:9.2f} ms "
+              f"({best / args.files * 1e9:.0f} ns/file)")
+    finally:
+        if cleanup:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Measure the memory cost of TextRenderNode with tracemalloc.
+
+Usage:
+    python benchmarks/bench_nodes.py [--leaves N]
+
+Builds a root with N leaf children (the common shape of a directory tree) and
+reports the bytes allocated per node, not counting the display strings, which
+are created before measuring starts.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+from ascii_tree import TextRenderNode, render
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leaves", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    names = [f"file_{i:07d}.txt" for i in range(args.leaves)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    root = TextRenderNode("root", children=[TextRenderNode(name) for name in names])
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    node_count = args.leaves + 1
+    print(f"nodes      {node_count}")
+    print(f"memory     {current / node_count:6.1f} bytes/node "
+          f"(peak {peak / node_count:.1f})")
+    print(f"build      {elapsed * 1000:9.2f} ms")
+
+    start = time.perf_counter()
+    render(root)
+    print(f"render     {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Time `ascii_tree.renderable_from_parents` on a wide, deep hierarchy.
+
+Usage:
+    python benchmarks/bench_parents.py [--leaves N] [--depth D] [--fanout F]
+
+Leaves hang `--per-parent` at a time off a hierarchy `depth` levels deep with
+`fanout` children per level, so they share long ancestor chains.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import ascii_tree  # noqa: E402
+from trees import parented_objects  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leaves", type=int, default=500_000)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--per-parent", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    leaves = parented_objects(
+        args.leaves, args.depth, args.fanout, args.per_parent
+    )
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        roots = ascii_tree.renderable_from_parents(
+            leaves, parent_attr="parent", display_attr="name"
+        )
+        best = min(best, time.perf_counter() - start)
+    print(f"leaves={args.leaves} depth={args.depth} roots={len(roots)} "
+          f"best={best * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Time `ascii_tree.render` on wide, deep and balanced trees.
+
+Usage:
+    python benchmarks/bench_render.py [--repeat N]
+
+Run it against two checkouts (e.g. with PYTHONPATH pointing at each `src`
+directory) to compare implementations.  The deep tree is kept shallow enough
+for a recursive renderer to handle.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import ascii_tree  # noqa: E402
+from trees import balanced_tree, deep_tree, node_count, wide_tree  # noqa: E402
+
+
+CASES = {
+    "wide": lambda: wide_tree(200_000),
+    "deep": lambda: deep_tree(900),
+    "balanced": lambda: balanced_tree(4, 9),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, build in CASES.items():
+        root = build()
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = ascii_tree.render(root)
+            best = min(best, time.perf_counter() - start)
+        print(
+            f"{name:<10} nodes={node_count(root):<8} "
+            f"chars={len(output):<10} best={best * 1000:9.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
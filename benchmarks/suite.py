@@ -0,0 +1,279 @@
+"""Run the benchmark suite, or compare two of its result files.
+
+Usage:
+    python benchmarks/suite.py run [--output FILE] [--repeat N] [--quick]
+                                   [--only PATTERN] [--fixtures DIR]
+    python benchmarks/suite.py compare BASELINE CURRENT [--threshold 0.1]
+
+`run` times every case (the best of `--repeat` runs, with the garbage
+collector off, like `timeit`), then measures its peak traced memory in one
+more run under `tracemalloc`.  Results are printed, and written as JSON with
+`--output`.
+
+`compare` matches cases by name and prints the change in time and peak
+memory.  It exits with status 1 if any case got slower or bigger by more than
+`--threshold` (a fraction: 0.1 is 10%), so it can gate a CI job.
+
+The directory fixtures are generated once under `--fixtures` (by default in
+the system's temp directory) and reused by later runs.
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import ascii_tree  # noqa: E402
+from trees import (  # noqa: E402
+    balanced_tree,
+    dag_tree,
+    deep_tree,
+    ladder_tree,
+    make_dir_fixture,
+    nested_objects,
+    node_count,
+    parented_objects,
+    wide_tree,
+)
+
+# A case's setup takes the size scale and the fixtures directory, and returns
+# the function to time along with the number of items it processes.
+Setup = t.Callable[[float, Path], t.Tuple[t.Callable[[], t.Any], int]]
+
+CASES: t.Dict[str, Setup] = {}
+
+
+def case(name: str) -> t.Callable[[Setup], Setup]:
+    def register(setup: Setup) -> Setup:
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+@case("render.wide")
+def render_wide(scale, fixtures):
+    root = wide_tree(int(200_000 * scale))
+    return lambda: ascii_tree.render(root), node_count(root)
+
+
+@case("render.deep")
+def render_deep(scale, fixtures):
+    # the output of a chain grows with the square of its depth
+    root = deep_tree(int(2_000 * scale))
+    return lambda: ascii_tree.render(root), node_count(root)
+
+
+@case("render.balanced")
+def render_balanced(scale, fixtures):
+    root = balanced_tree(4, 9 if scale >= 1 else 7)
+    return lambda: ascii_tree.render(root), node_count(root)
+
+
+@case("render.dag")
+def render_dag(scale, fixtures):
+    root = dag_tree(layers=8 if scale >= 1 else 6, width=50, fanout=4)
+    line_count = sum(1 for _ in ascii_tree.iter_render(root))
+    return lambda: ascii_tree.render(root), line_count
+
+
+@case("render.flat")
+def render_flat(scale, fixtures):
+    flat = ascii_tree.FlatTree.from_node(balanced_tree(4, 9 if scale >= 1 else 7))
+    return lambda: ascii_tree.render(flat), len(flat)
+
+
+@case("render.flat_deep_truncated")
+def render_flat_deep_truncated(scale, fixtures):
+    # skipping a subtree should cost its size, not the depth of the tree
+    flat = ascii_tree.FlatTree.from_node(ladder_tree(int(4_000 * scale)))
+    return lambda: ascii_tree.render(flat, max_children=1), len(flat)
+
+
+@case("render.cache_update")
+def render_cache_update(scale, fixtures):
+    # redraw a deep chain after its deepest node changes
+    root = deep_tree(int(1_500 * scale))
+    leaf = root
+    while leaf.children:
+        leaf = leaf.children[0]
+    cache = ascii_tree.RenderCache()
+    cache.render(root)
+
+    def update():
+        leaf.display = leaf.display[::-1]
+        cache.invalidate(leaf)
+        cache.render(root)
+
+    return update, 1
+
+
+@case("build.renderable")
+def build_renderable(scale, fixtures):
+    depth = 8 if scale >= 1 else 6
+    obj = nested_objects(5, depth)
+    count = sum(5**level for level in range(depth))
+    return lambda: ascii_tree.renderable(obj), count
+
+
+@case("build.from_parents")
+def build_from_parents(scale, fixtures):
+    leaf_count = int(200_000 * scale)
+    leaves = parented_objects(leaf_count, depth=20, fanout=4)
+    return (
+        lambda: ascii_tree.renderable_from_parents(
+            leaves, parent_attr="parent", display_attr="name"
+        ),
+        leaf_count,
+    )
+
+
+@case("dirtree.walk")
+def dirtree_walk(scale, fixtures):
+    file_count = int(200_000 * scale)
+    root = fixtures / f"files_{file_count}"
+    make_dir_fixture(root, file_count, files_per_dir=200)
+    return lambda: ascii_tree.renderable_dir_tree(root), file_count
+
+
+@case("dirtree.walk_flat")
+def dirtree_walk_flat(scale, fixtures):
+    file_count = int(200_000 * scale)
+    root = fixtures / f"files_{file_count}"
+    make_dir_fixture(root, file_count, files_per_dir=200)
+    return lambda: ascii_tree.renderable_dir_tree(root, flat=True), file_count
+
+
+def measure(func: t.Callable[[], t.Any], repeat: int) -> t.Tuple[float, int]:
+    """The best time of `repeat` calls, and the peak memory of one more."""
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(args: argparse.Namespace) -> int:
+    scale = 0.1 if args.quick else 1.0
+    fixtures = Path(args.fixtures)
+    fixtures.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for name, setup in CASES.items():
+        if args.only and not fnmatch.fnmatch(name, args.only):
+            continue
+        func, items = setup(scale, fixtures)
+        seconds, peak = measure(func, args.repeat)
+        results[name] = {"seconds": seconds, "peak_bytes": peak, "items": items}
+        print(
+            f"{name:<20} items={items:<9} best={seconds * 1000:10.2f} ms "
+            f"peak={peak / 2**20:8.1f} MiB",
+            flush=True,
+        )
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "quick": args.quick,
+            "results": results,
+        }
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    with open(args.baseline) as fp:
+        baseline_report = json.load(fp)
+    with open(args.current) as fp:
+        current_report = json.load(fp)
+    if baseline_report.get("quick") != current_report.get("quick"):
+        print("warning: only one of the runs used --quick; sizes differ\n")
+    baseline = baseline_report["results"]
+    current = current_report["results"]
+
+    regressions = []
+    for name in sorted(baseline.keys() & current.keys()):
+        changes = []
+        for metric in ("seconds", "peak_bytes"):
+            before = baseline[name][metric]
+            after = current[name][metric]
+            change = (after - before) / before if before else 0.0
+            if change > args.threshold:
+                regressions.append(f"{name} {metric}")
+            changes.append(f"{metric}={change:+7.1%}")
+        print(f"{name:<20} {'  '.join(changes)}")
+
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f"{name:<20} only in {'baseline' if name in baseline else 'current'}")
+
+    if regressions:
+        print(f"\nRegressed by more than {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("--output", help="Write the results to this JSON file.")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument(
+        "--quick", action="store_true", help="Use trees a tenth of the size."
+    )
+    run_parser.add_argument(
+        "--only", help="Only run cases matching this glob (e.g. 'render.*')."
+    )
+    run_parser.add_argument(
+        "--fixtures",
+        default=str(Path(tempfile.gettempdir()) / "ascii-tree-benchmarks"),
+        help="Where to generate directory fixtures.",
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare two result files."
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Synthetic tree generators shared by the benchmark scripts."""
+from __future__ import annotations
+
+import os
+import typing as t
+from pathlib import Path
+
+from ascii_tree import TextRenderNode
+
+
+def wide_tree(width: int) -> TextRenderNode:
+    """A root with `width` leaf children."""
+    return TextRenderNode(
+        "root", children=[TextRenderNode(f"leaf_{i}") for i in range(width)]
+    )
+
+
+def deep_tree(depth: int) -> TextRenderNode:
+    """A single chain of `depth` nodes."""
+    root = node = TextRenderNode("node_0")
+    for i in range(1, depth):
+        child = TextRenderNode(f"node_{i}")
+        node.children.append(child)
+        node = child
+    return root
+
+
+def ladder_tree(depth: int) -> TextRenderNode:
+    """A chain `depth` nodes deep, where each node also has a second child.
+
+    The second children each have a leaf of their own, so rendering with
+    `max_children=1` skips a small subtree at every level.
+    """
+    root = node = TextRenderNode("node_0")
+    for i in range(1, depth):
+        child = TextRenderNode(f"node_{i}")
+        side = TextRenderNode(f"side_{i}", children=[TextRenderNode(f"leaf_{i}")])
+        node.children.extend([child, side])
+        node = child
+    return root
+
+
+def balanced_tree(branching: int, depth: int) -> TextRenderNode:
+    """A complete tree with `branching` children per node, `depth` levels deep."""
+    root = TextRenderNode("root")
+    level: t.List[TextRenderNode] = [root]
+    for d in range(1, depth):
+        next_level = []
+        for parent in level:
+            for i in range(branching):
+                child = TextRenderNode(f"node_{d}_{i}")
+                parent.children.append(child)
+                next_level.append(child)
+        level = next_level
+    return root
+
+
+def dag_tree(layers: int, width: int, fanout: int) -> TextRenderNode:
+    """A layered DAG: every node links to `fanout` nodes of the next layer.
+
+    Nodes are shared between parents, so the rendered tree repeats them; it
+    has about `fanout ** layers` lines while holding only `layers * width`
+    nodes.
+    """
+    level = [TextRenderNode(f"node_{layers - 1}_{i}") for i in range(width)]
+    for d in range(layers - 2, -1, -1):
+        level = [
+            TextRenderNode(
+                f"node_{d}_{i}",
+                children=[level[(i + j) % width] for j in range(fanout)],
+            )
+            for i in range(width)
+        ]
+    return TextRenderNode("root", children=level[:fanout])
+
+
+class NestedObject:
+    """A plain object tree, for building with `ascii_tree.renderable`.
+
+    `renderable` reads children through the default interface, so these use
+    the default attribute names.
+    """
+
+    __slots__ = ("display", "children")
+
+    def __init__(self, display: str, children: t.List[NestedObject]):
+        self.display = display
+        self.children = children
+
+
+def nested_objects(branching: int, depth: int) -> NestedObject:
+    """A complete tree of NestedObjects, like `balanced_tree`."""
+    if depth <= 1:
+        return NestedObject("leaf", [])
+    return NestedObject(
+        f"node_{depth}",
+        [nested_objects(branching, depth - 1) for _ in range(branching)],
+    )
+
+
+def node_count(root: TextRenderNode) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def make_dir_fixture(root: Path, file_count: int, files_per_dir: int) -> None:
+    """Create `file_count` empty files under `root`, `files_per_dir` per folder.
+
+    Folders are nested two levels deep (`d0000/d0000_00/`).  Existing files are
+    left alone, so a fixture can be reused between runs.
+    """
+    dir_count = max(1, -(-file_count // files_per_dir))
+    created = 0
+    for d in range(dir_count):
+        folder = root / f"d{d // 100:04d}" / f"d{d // 100:04d}_{d % 100:02d}"
+        os.makedirs(folder, exist_ok=True)
+        for f in range(min(files_per_dir, file_count - created)):
+            file_path = os.path.join(folder, f"file_{f:05d}.txt")
+            if not os.path.exists(file_path):
+                open(file_path, "w").close()
+        created += files_per_dir
+
+
+class ParentedObject:
+    """An object that only knows its parent, for `renderable_from_parents`."""
+
+    __slots__ = ("name", "parent")
+
+    def __init__(self, name: str, parent: t.Optional[ParentedObject] = None):
+        self.name = name
+        self.parent = parent
+
+
+def parented_objects(
+    leaf_count: int, depth: int, fanout: int, leaves_per_parent: int = 50
+) -> t.List[ParentedObject]:
+    """Leaves hung `leaves_per_parent` at a time off a deep, branching hierarchy.
+
+    The hierarchy is `depth` levels deep with up to `fanout` children per
+    node, and only contains the branches that leaves actually hang from, so
+    leaves share long ancestor chains.  Returns just the leaves.
+    """
+    root = ParentedObject("root")
+    interior: t.Dict[t.Tuple[int, ...], ParentedObject] = {(): root}
+    leaves = []
+    for i in range(leaf_count):
+        bucket = i // leaves_per_parent
+        digits = []
+        for _ in range(depth):
+            digits.append(bucket % fanout)
+            bucket //= fanout
+        path: t.Tuple[int, ...] = ()
+        parent = root
+        for digit in reversed(digits):
+            path += (digit,)
+            node = interior.get(path)
+            if node is None:
+                node = interior[path] = ParentedObject(f"n{digit}", parent)
+            parent = node
+        leaves.append(ParentedObject(f"leaf_{i}", parent))
+    return leaves
@@ -5,3 +5,14 @@ import nox
 def tests(session):
     session.install(".")
     session.run("pytest", "tests")
+
+
+@nox.session
+def benchmarks(session):
+    """Run the benchmark suite.
+
+    Pass arguments after `--`, e.g. `nox -s benchmarks -- run --output
+    new.json`, or `nox -s benchmarks -- compare old.json new.json`.
+    """
+    session.install(".")
+    session.run("python", "benchmarks/suite.py", *(session.posargs or ["run"]))
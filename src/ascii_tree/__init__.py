@@ -1,9 +1,26 @@
 from __future__ import annotations
+import asyncio
+import codecs
+import heapq
+import io
+import itertools
+import json
+import operator
+import os
+import re
+import time
 import typing as t
 import typing_extensions as te
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from pathlib import Path
 
 from ascii_tree import styles
+from ascii_tree.flat import FlatTree
+from ascii_tree.incremental import RenderCache
+from ascii_tree.parsing import detect_style, parse
+from ascii_tree.patterns import PatternFilter
+from ascii_tree.scan_cache import ScanCache, _MTIME_RESOLUTION_NS
+from ascii_tree.stats import Stats
 
 T = t.TypeVar("T")
 
@@ -14,7 +31,16 @@ class Renderable(te.Protocol):
 
 
 class TextRenderNode:
-    """Basic tree node for use with render_tree."""
+    """Basic tree node for use with render_tree.
+
+    Nodes use `__slots__`, and a node without children shares a single empty
+    tuple instead of owning an empty list.  A real list is only allocated the
+    first time `children` is read, so a leaf that is only ever rendered costs
+    no list at all, which matters for trees (like directory trees) where most
+    nodes are leaves.
+    """
+
+    __slots__ = ("display", "_children")
 
     def __init__(
         self,
@@ -22,10 +48,101 @@ class TextRenderNode:
         children: t.Optional[t.MutableSequence[TextRenderNode]] = None,
     ):
         self.display: str = display
-        self.children: t.MutableSequence[TextRenderNode] = (
-            children if children is not None else []
+        self._children: t.MutableSequence[TextRenderNode] = (
+            children if children is not None else _NO_CHILDREN
         )
 
+    @property
+    def children(self) -> t.MutableSequence[TextRenderNode]:
+        children = self._children
+        if children is _NO_CHILDREN:
+            children = self._children = []
+        return children
+
+    @children.setter
+    def children(self, value: t.MutableSequence[TextRenderNode]):
+        self._children = value
+
+
+# Shared by every TextRenderNode that has no children.
+_NO_CHILDREN: t.Any = ()
+
+
+def _children_of(node: Renderable) -> t.Sequence[Renderable]:
+    """A node's children, without giving a TextRenderNode leaf a list."""
+    if type(node) is TextRenderNode:
+        return node._children
+    return node.children
+
+
+_UNRESOLVED: t.Any = object()
+
+
+class LazyRenderNode:
+    """Tree node that reads its display and children from an object on demand.
+
+    Nothing is read from the wrapped object until `display` or `children` is
+    first accessed; the result is then cached on the node.  Children are
+    wrapped in LazyRenderNodes of their own, so only the parts of the tree
+    that are actually visited (e.g. by a depth-limited render) ever touch the
+    source objects.
+
+    Use `renderable(obj, ..., lazy=True)` to create one.
+    """
+
+    __slots__ = (
+        "_obj",
+        "_display_interface",
+        "_children_interface",
+        "_display",
+        "_children",
+    )
+
+    def __init__(
+        self,
+        obj: t.Any,
+        display_attr: t.Optional[str] = None,
+        display_method: t.Optional[t.Callable[[], str]] = None,
+        display_function: t.Optional[t.Callable[[t.Any], str]] = None,
+        children_attr: t.Optional[str] = None,
+        children_method: t.Optional[t.Callable] = None,
+        children_function: t.Optional[t.Callable[[t.Any], t.Any]] = None,
+    ):
+        self._obj = obj
+        self._display_interface = (display_attr, display_method, display_function)
+        self._children_interface = (
+            children_attr,
+            children_method,
+            children_function,
+        )
+        self._display: str = _UNRESOLVED
+        self._children: t.MutableSequence[LazyRenderNode] = _UNRESOLVED
+
+    @property
+    def display(self) -> str:
+        if self._display is _UNRESOLVED:
+            self._display = _get_from_interface(
+                self._obj, "display", *self._display_interface
+            )
+        return self._display
+
+    @display.setter
+    def display(self, value: str):
+        self._display = value
+
+    @property
+    def children(self) -> t.MutableSequence[LazyRenderNode]:
+        if self._children is _UNRESOLVED:
+            children = _get_from_interface(
+                self._obj, "children", *self._children_interface
+            )
+            self._children = [LazyRenderNode(child) for child in children]
+        return self._children
+
+    @children.setter
+    def children(self, value: t.MutableSequence[LazyRenderNode]):
+        self._children = value
+
 
 def renderable(
     obj: T,
@@ -35,7 +152,9 @@ def renderable(
     children_attr: t.Optional[str] = None,
     children_method: t.Optional[t.Callable] = None,
     children_function: t.Optional[t.Callable[[T], str]] = None,
-) -> TextRenderNode:
+    lazy: bool = False,
+    stats: t.Optional[Stats] = None,
+) -> t.Union[TextRenderNode, LazyRenderNode]:
     """Create a TextRenderNode interface for a tree-structured object.
 
     Args:
@@ -47,6 +166,11 @@ def renderable(
             object.
         children_method: A method used to obtain the children of the object.
             Ignored if `children_attr` is provided.
+        lazy: If True, return a LazyRenderNode instead of copying the whole
+            object graph up front.  Display text and children are then only
+            read from objects the renderer actually visits.  Defaults to False.
+        stats: A Stats to record the build time, node count and callback
+            time in.  Nodes of a lazy tree aren't counted.  Defaults to None.
 
     If no attr or method is provided for either display or children, we'll
     default to obj.display and obj.children, respectively.
@@ -66,6 +190,35 @@ def renderable(
             "You must provide only interface: attr, method, or function."
         )
 
+    if stats is not None:
+        with stats.phase("build"):
+            node = renderable(
+                obj,
+                display_attr=display_attr,
+                display_method=display_method and stats.timed(display_method),
+                display_function=display_function
+                and stats.timed(display_function),
+                children_attr=children_attr,
+                children_method=children_method and stats.timed(children_method),
+                children_function=children_function
+                and stats.timed(children_function),
+                lazy=lazy,
+            )
+        if not lazy:
+            stats.nodes += _count_nodes([node])
+        return node
+
+    if lazy:
+        return LazyRenderNode(
+            obj,
+            display_attr=display_attr,
+            display_method=display_method,
+            display_function=display_function,
+            children_attr=children_attr,
+            children_method=children_method,
+            children_function=children_function,
+        )
+
     display = _get_from_interface(
         obj, "display", display_attr, display_method, display_function
     )
@@ -111,6 +264,7 @@ def renderable_from_parents(
     display_attr: t.Optional[str] = None,
     display_method: t.Optional[t.Callable] = None,
     display_function: t.Optional[t.Callable[[T], str]] = None,
+    stats: t.Optional[Stats] = None,
 ) -> t.List[TextRenderNode]:
     """Build a renderable tree from objects with only "parent" references.
 
@@ -120,7 +274,9 @@ def renderable_from_parents(
 
     Note that this function always returns a list of top-level TextRenderNodes,
     even if there is only one root node.  This is meant to support the case
-    where there are multiple roots in your given sequence.
+    where there are multiple roots in your given sequence.  Roots are returned
+    in the order they're first reached, and children in the order they're
+    first seen, so the result is the same from run to run.
 
     Args:
         objs: A sequence of objects to build the tree from.
@@ -131,13 +287,26 @@ def renderable_from_parents(
         display_attr: The attribute of the object to use as the display text.
         display_method: Method to call to get display text for the node.
         display_function: Function takes an object and returns the display.
+        stats: A Stats to record the build time, node count and callback
+            time in.  Defaults to None.
     """
+    if stats is not None:
+        with stats.phase("build"):
+            roots = renderable_from_parents(
+                objs,
+                parent_attr=parent_attr,
+                parent_method=parent_method and stats.timed(parent_method),
+                is_root_callback=is_root_callback and stats.timed(is_root_callback),
+                display_attr=display_attr,
+                display_method=display_method and stats.timed(display_method),
+                display_function=display_function
+                and stats.timed(display_function),
+            )
+        stats.nodes += _count_nodes(roots)
+        return roots
 
-    def get_parent(obj) -> T | None:
-        # ancestor is defined below - this is a closure
-        if ancestor is None:
-            return None
-        if is_root_callback and is_root_callback(ancestor):
+    def get_parent(obj: T) -> T | None:
+        if is_root_callback and is_root_callback(obj):
             return None
         if parent_attr:
             return getattr(obj, parent_attr)
@@ -146,40 +315,279 @@ def renderable_from_parents(
         else:
             return obj.parent
 
-    def make_node(obj):
-        return renderable(
-            obj,
-            display_attr=display_attr,
-            display_method=display_method,
-            display_function=display_function,
-            children_method=lambda: list(),
+    def make_node(obj: T) -> TextRenderNode:
+        return TextRenderNode(
+            display=_get_from_interface(
+                obj, "display", display_attr, display_method, display_function
+            )
         )
 
+    # Every object gets a node the first time it's seen, and its parent is
+    # looked up exactly once.  Walking up from each object stops at the first
+    # ancestor that already has a node, so shared ancestry is only walked once.
     node_dict: t.Dict[T, TextRenderNode] = dict()
-    roots = set()
+    roots: t.Dict[T, TextRenderNode] = dict()  # ordered by first appearance
     for obj in objs:
-        ancestor = obj
-        while ancestor:
-            if ancestor not in node_dict:
-                node_dict[ancestor] = make_node(ancestor)
-            parent = get_parent(ancestor)
-            ancestor = parent
-
-    visited = set()
-    for obj in objs:
-        ancestor = obj
-        while ancestor:
-            if ancestor in visited:
+        if obj in node_dict:
+            continue
+        chain: t.List[TextRenderNode] = []
+        ancestor: T | None = obj
+        top = obj
+        parent_node = None
+        while ancestor is not None:
+            parent_node = node_dict.get(ancestor)
+            if parent_node is not None:
                 break
-            visited.add(ancestor)
-            parent = get_parent(ancestor)
-            if parent:
-                node_dict[parent].children.append(node_dict[ancestor])
+            node = node_dict[ancestor] = make_node(ancestor)
+            chain.append(node)
+            top = ancestor
+            ancestor = get_parent(ancestor)
+
+        for child_node, node in zip(chain, chain[1:]):
+            node.children.append(child_node)
+        if parent_node is not None:
+            parent_node.children.append(chain[-1])
+        else:
+            roots[top] = chain[-1]
+
+    return list(roots.values())
+
+
+# Marks a child index whose node has dropped children; see renderable_from_paths
+_TRUNCATED = object()
+
+
+def renderable_from_paths(
+    paths: t.Iterable[str],
+    sep: str = "/",
+    max_children: t.Optional[int] = None,
+    ellipsis_after_max_children: bool = True,
+) -> t.List[TextRenderNode]:
+    """Build renderable trees from delimited paths.
+
+    Each path (an object-store key, a dotted module name, a URL route...) is
+    split on `sep`, and its segments become a chain of nodes, sharing the
+    nodes of any path seen earlier with the same leading segments.  Empty
+    segments, such as those from a leading or doubled separator, are ignored.
+
+    `paths` is consumed one item at a time, so it can be a generator over far
+    more paths than would fit in a list.  Each node keeps a dict of its
+    children by name, so every path is inserted in time proportional to its
+    number of segments.
+
+    Like `renderable_from_parents`, this always returns a list of top-level
+    TextRenderNodes, in the order they're first seen.
+
+    Args:
+        paths: An iterable of delimited strings.
+        sep: The delimiter between path segments. Defaults to "/".
+        max_children: The maximum number of children to keep per node
+            (including the roots).  Paths that would add another child are
+            dropped. Defaults to None (no limit).
+        ellipsis_after_max_children: Whether to add an ellipsis node to a
+            node that had children dropped because of `max_children`.
+            Defaults to True.
+    """
+    roots: t.List[TextRenderNode] = []
+    # Maps each segment to [node, the same kind of index for its children].
+    # Leaves don't get a child index until something is added under them.
+    root_index: t.Dict[t.Any, t.List[t.Any]] = {}
+
+    for path in paths:
+        parent = None
+        index: t.Optional[t.Dict[t.Any, t.List[t.Any]]] = root_index
+        entry: t.List[t.Any] = []
+        for segment in path.split(sep):
+            if not segment:
+                continue
+            if index is None:
+                index = entry[1] = {}
+            found = index.get(segment)
+            if found is None:
+                siblings = roots if parent is None else parent.children
+                if max_children is not None and len(index) >= max_children:
+                    # the ellipsis is recorded in the index itself, so it's
+                    # only added once
+                    if _TRUNCATED not in index:
+                        index[_TRUNCATED] = [None, None]
+                        if ellipsis_after_max_children:
+                            siblings.append(TextRenderNode(display="..."))
+                    break
+                node = TextRenderNode(display=segment)
+                siblings.append(node)
+                found = index[segment] = [node, None]
+            entry = found
+            parent, index = entry
+
+    return roots
+
+
+def renderable_from_rows(
+    rows: t.Iterable[t.Tuple[t.Hashable, t.Optional[t.Hashable], str]],
+    orphans_as_roots: bool = False,
+) -> t.List[TextRenderNode]:
+    """Build renderable trees from (id, parent_id, display) rows.
+
+    This suits adjacency-list data, like a database table with a parent id
+    column or a CSV export: pass a sqlite3 cursor, a csv reader, or any other
+    iterable of 3-tuples.  A `parent_id` of None marks a root.
+
+    Rows can come in any order; a child seen before its parent waits in an
+    index keyed by the parent's id until that parent turns up.  The rows are
+    consumed one at a time and only the nodes are kept.  Children, like
+    roots, are kept in the order their rows appear.
+
+    Args:
+        rows: An iterable of (id, parent_id, display) tuples.  Ids can be any
+            hashable values.
+        orphans_as_roots: If True, rows whose parent never appears become
+            roots (after the real roots).  If False, orphans raise a
+            ValueError. Defaults to False.
+
+    Returns:
+        A list of top-level TextRenderNodes, like `renderable_from_parents`.
+
+    Raises:
+    ValueError: If an id appears twice, if a row's parent never appears (and
+        orphans_as_roots is False), or if some rows form a cycle, since they
+        can never be reached from a root.
+    """
+    nodes: t.Dict[t.Hashable, TextRenderNode] = dict()
+    # children seen before their parent, keyed by the parent's id
+    waiting: t.Dict[t.Hashable, t.List[TextRenderNode]] = dict()
+    roots: t.List[TextRenderNode] = []
+
+    for row_id, parent_id, display in rows:
+        if row_id in nodes:
+            raise ValueError(f"Duplicate id {row_id!r}.")
+        node = TextRenderNode(display=display, children=waiting.pop(row_id, None))
+        nodes[row_id] = node
+        if parent_id is None:
+            roots.append(node)
+        elif parent_id == row_id:
+            raise ValueError(f"Cycle: {row_id!r} is its own parent.")
+        else:
+            parent = nodes.get(parent_id)
+            if parent is not None:
+                parent.children.append(node)
             else:
-                roots.add(node_dict[ancestor])
-            ancestor = parent
+                waiting.setdefault(parent_id, []).append(node)
 
-    return list(roots)
+    if waiting:
+        if not orphans_as_roots:
+            raise ValueError(
+                "Orphaned rows: no row has the parent id "
+                + _preview(list(waiting))
+                + "."
+            )
+        for orphans in waiting.values():
+            roots.extend(orphans)
+
+    # Every node has a single parent, so nodes in a cycle can't be reached
+    # from a root, and walking down from the roots can't loop.
+    reached = _count_nodes(roots)
+    if reached != len(nodes):
+        reachable = _node_ids(roots)
+        cycle_ids = [
+            row_id for row_id, node in nodes.items() if id(node) not in reachable
+        ]
+        raise ValueError(
+            f"Cycle: {len(cycle_ids)} rows can't be reached from a root, "
+            f"including {_preview(cycle_ids)}."
+        )
+    return roots
+
+
+def _count_nodes(roots: t.Iterable[Renderable]) -> int:
+    count = 0
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(_children_of(node))
+    return count
+
+
+def _node_ids(roots: t.Iterable[Renderable]) -> t.Set[int]:
+    ids = set()
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        ids.add(id(node))
+        stack.extend(_children_of(node))
+    return ids
+
+
+def _preview(values: t.Sequence[t.Any], limit: int = 10) -> str:
+    text = ", ".join(repr(value) for value in values[:limit])
+    if len(values) > limit:
+        text += f", ... ({len(values) - limit} more)"
+    return text
+
+
+class DirRenderNode(TextRenderNode):
+    """A directory node with totals for everything below it.
+
+    Built by `renderable_dir_tree` and `arenderable_dir_tree` with `totals`.
+    The totals cover every entry that passes the filters, including files
+    hidden by `max_file_count`.  Directories past `max_dir_depth`, or that
+    couldn't be read, aren't listed, so they count as empty and the totals
+    of the directories above them are marked `partial`.
+
+    Attributes:
+        size: The total size in bytes of the files below this directory.
+        file_count: The number of files below this directory.
+        dir_count: The number of directories below this directory, not
+            counting itself.
+        partial: Whether some directory below this one (or this one itself)
+            wasn't listed, so the totals are lower bounds.
+    """
+
+    __slots__ = ("size", "file_count", "dir_count", "partial")
+
+    def __init__(
+        self,
+        display: str,
+        children: t.Optional[t.MutableSequence[TextRenderNode]] = None,
+        size: int = 0,
+        file_count: int = 0,
+        dir_count: int = 0,
+        partial: bool = False,
+    ):
+        super().__init__(display, children)
+        self.size = size
+        self.file_count = file_count
+        self.dir_count = dir_count
+        self.partial = partial
+
+
+def format_size(size: int) -> str:
+    """A size in bytes in binary units, like `512 B` or `4.2 MiB`."""
+    if size < 1024:
+        return f"{size} B"
+    value = float(size)
+    for unit in ("KiB", "MiB", "GiB", "TiB"):
+        value /= 1024
+        if value < 1024:
+            break
+    else:
+        unit = "PiB"
+        value /= 1024
+    return f"{value:.1f} {unit}"
+
+
+def display_with_totals(node: DirRenderNode) -> str:
+    """A directory's display followed by its file count and total size.
+
+    For use as `renderable_dir_tree`'s `totals_display`, e.g.
+    `src / (12 files, 4.2 KiB)`, or `src / (at least 12 files, 4.2 KiB)` if
+    the totals are partial.
+    """
+    files = "file" if node.file_count == 1 else "files"
+    totals = f"{node.file_count:,} {files}, {format_size(node.size)}"
+    if node.partial:
+        totals = f"at least {totals}"
+    return f"{node.display} ({totals})"
 
 
 def renderable_dir_tree(
@@ -193,7 +601,18 @@ def renderable_dir_tree(
     ellipsis_after_max_depth: bool = True,
     ellipsis_after_max_files: bool = True,
     skip_if_no_permission: bool = True,
-) -> TextRenderNode:
+    workers: t.Optional[int] = None,
+    flat: bool = False,
+    cache: t.Union[ScanCache, str, Path, None] = None,
+    stats: t.Optional[Stats] = None,
+    totals: bool = False,
+    totals_display: t.Optional[t.Callable[[DirRenderNode], str]] = None,
+    include: t.Sequence[str] = (),
+    exclude: t.Sequence[str] = (),
+    gitignore: bool = False,
+    sort: t.Optional[str] = "name",
+    dirs_first: bool = False,
+) -> t.Union[TextRenderNode, FlatTree]:
     """Create a TextRenderNode tree from a given file system path.
 
     Args:
@@ -206,8 +625,10 @@ def renderable_dir_tree(
         dir_filter: A callable that takes a Path object and returns True if
             the directory should be included in the tree. Defaults to None.
         max_file_count: The maximum number of files to include in the tree per
-            directory. If not specified, all files will be included. Defaults
-            to None.
+            directory. If not specified, all files will be included.  The
+            files kept are the first ones in `sort` order, picked out with a
+            bounded heap, so showing the 20 newest files of a huge directory
+            doesn't sort all of them.  Defaults to None.
         file_filter: A callable that takes a Path object and returns True if
             the file should be included in the tree. Defaults to None.
         slash_after_dir: Whether to add a forward slash after
@@ -220,114 +641,889 @@ def renderable_dir_tree(
             to True.
         skip_if_no_permission: Whether to skip adding a node to
             the tree if permission is denied to access it. Defaults to True.
+        workers: The number of threads used to list directories.  When
+            greater than 1, sibling subdirectories are listed concurrently,
+            which helps most on network file systems where each listing waits
+            on the server.  The resulting tree is the same as a serial walk.
+            Defaults to None (list directories one at a time).
+        flat: If True, build a FlatTree instead of TextRenderNodes, which
+            uses far less memory for trees with millions of entries.
+            Defaults to False.
+        cache: A ScanCache, or the path of a cache file, holding directory
+            listings from earlier scans.  Directories that haven't changed
+            since are not read again.  A cache file is created if needed and
+            updated after the scan; a ScanCache is left for you to `save`.
+            Defaults to None (no caching).
+        stats: A Stats to record the build and listing times, directories
+            and entries listed, permission errors and filter callback time in.
+            Defaults to None.
+        totals: If True, directories are built as DirRenderNodes, with the
+            size and number of the files and directories below them added up
+            during the same walk.  File sizes come from the directory
+            listing where the platform provides them (Windows), and cost an
+            `lstat` per file elsewhere.  Defaults to False.
+        totals_display: A callable that takes a directory's DirRenderNode,
+            once its totals are known, and returns its display text (such as
+            `display_with_totals`).  Implies `totals`.  Defaults to None.
+        include: `.gitignore`-style patterns; if any are given, only files
+            matching one of them are included.  A pattern with a trailing
+            slash, like `src/`, includes every file below a matching
+            directory.  Defaults to ().
+        exclude: `.gitignore`-style patterns for files and directories to
+            leave out, matched against paths relative to `path`.  Excluded
+            directories are never read.  Unlike `dir_filter` and
+            `file_filter`, all of the patterns are compiled into a single
+            regular expression, which is much faster for many patterns.
+            Defaults to ().
+        gitignore: Whether to leave out what the `.gitignore` files in the
+            tree (at or below `path`) ignore, as well as `.git` directories.
+            Defaults to False.
+        sort: The order of each directory's entries: "name", "natural"
+            (numbers in names compared by value, ignoring case), "size"
+            (largest first) or "mtime" (newest first), with ties broken by
+            name.  None keeps the order the file system lists them in, which
+            can change from one run to the next.  Sorting by size or mtime
+            costs an `lstat` per entry, except on Windows.  Defaults to
+            "name".
+        dirs_first: Whether to list each directory's subdirectories before
+            its files.  Defaults to False.
 
     Returns:
     TextRenderNode: A tree node representing the file system tree rooted at the
-        given path.
+        given path (or a FlatTree of it, if `flat` is True).
 
     Raises:
     PermissionError: If permission is denied to access a node in the file system
         tree and skip_if_no_permission is False.
+    ValueError: If `totals` or `totals_display` is combined with `flat`, or
+        `sort` isn't one of the orders above.
 
     """
     if recursive is False:
         max_dir_depth = 1
+    totals = totals or totals_display is not None
+    if totals and flat:
+        raise ValueError("Directory totals are not available with flat=True.")
 
-    def _build_tree(
-        node_path: Path,
-        current_depth: int,
-        max_depth: t.Optional[int],
-        max_files: t.Optional[int],
+    if stats is not None:
+        dir_filter = dir_filter and stats.timed(dir_filter)
+        file_filter = file_filter and stats.timed(file_filter)
+
+    builder = _DirTreeBuilder(
+        max_depth=max_dir_depth,
+        max_files=max_file_count,
+        dir_filter=dir_filter,
+        file_filter=file_filter,
+        slash_after_dir=slash_after_dir,
+        ellipsis_after_max_depth=ellipsis_after_max_depth,
+        ellipsis_after_max_files=ellipsis_after_max_files,
+        skip_if_no_permission=skip_if_no_permission,
+        cache=ScanCache(cache) if isinstance(cache, (str, Path)) else cache,
+        stats=stats,
+        totals=totals,
+        totals_display=totals_display,
+        sort=sort,
+        dirs_first=dirs_first,
+    )
+    root_path = Path(path).resolve()
+    builder.pattern_filter = _pattern_filter(root_path, include, exclude, gitignore)
+
+    def build() -> t.Union[TextRenderNode, FlatTree]:
+        if flat:
+            return builder.build_flat(FlatTree(), str(root_path), root_path.name)
+        return builder.build(str(root_path), root_path.name)
+
+    def build_with_workers() -> t.Union[TextRenderNode, FlatTree]:
+        if not workers or workers < 2:
+            return build()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            builder.executor = executor
+            return build()
+
+    if stats is None:
+        tree = build_with_workers()
+    else:
+        with stats.phase("build"):
+            tree = build_with_workers()
+        stats.nodes += len(tree) if flat else _count_nodes([tree])
+
+    if isinstance(cache, (str, Path)):
+        builder.cache.save()
+    return tree
+
+
+async def arenderable_dir_tree(
+    path: t.Union[str, Path],
+    recursive: bool = True,
+    max_dir_depth: t.Optional[int] = None,
+    dir_filter: t.Callable[[Path], bool] | None = None,
+    max_file_count: t.Optional[int] = None,
+    file_filter: t.Callable[[Path], bool] | None = None,
+    slash_after_dir: bool = True,
+    ellipsis_after_max_depth: bool = True,
+    ellipsis_after_max_files: bool = True,
+    skip_if_no_permission: bool = True,
+    workers: t.Optional[int] = 4,
+    executor: t.Optional[Executor] = None,
+    cache: t.Union[ScanCache, str, Path, None] = None,
+    stats: t.Optional[Stats] = None,
+    totals: bool = False,
+    totals_display: t.Optional[t.Callable[[DirRenderNode], str]] = None,
+    include: t.Sequence[str] = (),
+    exclude: t.Sequence[str] = (),
+    gitignore: bool = False,
+    sort: t.Optional[str] = "name",
+    dirs_first: bool = False,
+) -> TextRenderNode:
+    """Asynchronous version of `renderable_dir_tree`.
+
+    Each directory is listed (and its entries filtered) in an executor, so
+    the event loop stays free to serve other tasks while a large tree is
+    scanned.  The result is the same TextRenderNode tree the synchronous
+    version builds.
+
+    Args:
+        path, recursive, max_dir_depth, dir_filter, max_file_count,
+        file_filter, slash_after_dir, ellipsis_after_max_depth,
+        ellipsis_after_max_files, skip_if_no_permission, cache, stats,
+        totals, totals_display, include, exclude, gitignore, sort, dirs_first:
+            See `renderable_dir_tree`.
+        workers: The maximum number of directories this call will have
+            listed at once.  Defaults to 4.
+        executor: The executor used to list directories.  Defaults to None
+            (the event loop's default executor).
+
+    Returns:
+    TextRenderNode: A tree node representing the file system tree rooted at the
+        given path.
+
+    Raises:
+    PermissionError: If permission is denied to access a node in the file system
+        tree and skip_if_no_permission is False.
+    """
+    if recursive is False:
+        max_dir_depth = 1
+
+    if stats is not None:
+        dir_filter = dir_filter and stats.timed(dir_filter)
+        file_filter = file_filter and stats.timed(file_filter)
+
+    builder = _DirTreeBuilder(
+        max_depth=max_dir_depth,
+        max_files=max_file_count,
+        dir_filter=dir_filter,
+        file_filter=file_filter,
+        slash_after_dir=slash_after_dir,
+        ellipsis_after_max_depth=ellipsis_after_max_depth,
+        ellipsis_after_max_files=ellipsis_after_max_files,
+        skip_if_no_permission=skip_if_no_permission,
+        cache=ScanCache(cache) if isinstance(cache, (str, Path)) else cache,
+        stats=stats,
+        totals=totals or totals_display is not None,
+        totals_display=totals_display,
+        sort=sort,
+        dirs_first=dirs_first,
+    )
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, workers or 1))
+
+    def scan_and_expand(
+        node_path: str, node_name: str, current_depth: int
+    ) -> t.Tuple[TextRenderNode, t.Optional[t.List[t.Tuple[int, str, str]]]]:
+        try:
+            entries = builder.list_dir(node_path)
+        except PermissionError:
+            if builder.skip_if_no_permission:
+                return builder.permission_denied_node(node_name), None
+            else:
+                raise
+        return builder.expand(node_name, entries, current_depth, node_path)
+
+    async def build(
+        node_path: str, node_name: str, current_depth: int
+    ) -> TextRenderNode:
+        if builder.is_past_max_depth(current_depth):
+            return builder.max_depth_node(node_name)
+
+        async with semaphore:
+            node, subdirs = await loop.run_in_executor(
+                executor, scan_and_expand, node_path, node_name, current_depth
+            )
+        if subdirs is None:
+            return node
+        if not subdirs:
+            if builder.totals:
+                builder.add_totals(node, [])
+            return node
+
+        tasks = [
+            asyncio.ensure_future(build(path, name, current_depth + 1))
+            for _, path, name in subdirs
+        ]
+        try:
+            child_nodes = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        children = node.children
+        for (index, _, _), child_node in zip(subdirs, child_nodes):
+            children[index] = child_node
+        if builder.totals:
+            builder.add_totals(node, child_nodes)
+        return node
+
+    root_path = await loop.run_in_executor(executor, Path(path).resolve)
+    builder.pattern_filter = _pattern_filter(root_path, include, exclude, gitignore)
+    if stats is None:
+        tree = await build(str(root_path), root_path.name, 0)
+    else:
+        with stats.phase("build"):
+            tree = await build(str(root_path), root_path.name, 0)
+        stats.nodes += _count_nodes([tree])
+    if isinstance(cache, (str, Path)):
+        await loop.run_in_executor(executor, builder.cache.save)
+    return tree
+
+
+class _WatchedDir:
+    """A directory known to a DirTreeWatcher, as of its last listing."""
+
+    __slots__ = ("signature", "node", "depth", "subdirs")
+
+    def __init__(
+        self,
+        signature: t.Optional[t.Tuple[int, int, int]],
+        node: TextRenderNode,
+        depth: int,
+        subdirs: t.List[str],
+    ):
+        self.signature = signature
+        self.node = node
+        self.depth = depth
+        self.subdirs = subdirs
+
+
+class DirTreeWatcher:
+    """Keeps a directory tree up to date by polling directory mtimes.
+
+    The first scan is the same as `renderable_dir_tree`.  After that, each
+    call to `refresh` stats every directory in the tree, re-lists only the
+    ones whose mtime changed, and updates their nodes in place.  Files are
+    never stat'ed, and unchanged directories are never listed, so the work per
+    refresh follows the number of directories and changes rather than the
+    number of files.
+
+    A directory's mtime changes when entries are added, removed or renamed
+    in it, not when a file's contents change, so file contents are not
+    watched.
+
+    Pair it with a `RenderCache` to redraw only what changed:
+
+        watcher = DirTreeWatcher("some/dir")
+        cache = RenderCache()
+        while True:
+            changed = watcher.refresh()
+            if changed:
+                cache.invalidate(*changed)
+                print(cache.render(watcher.tree))
+
+    Args:
+        path, recursive, max_dir_depth, dir_filter, max_file_count,
+        file_filter, slash_after_dir, ellipsis_after_max_depth,
+        ellipsis_after_max_files, skip_if_no_permission, include, exclude,
+        gitignore, sort, dirs_first:
+            See `renderable_dir_tree`.
+    """
+
+    def __init__(
+        self,
+        path: t.Union[str, Path],
+        recursive: bool = True,
+        max_dir_depth: t.Optional[int] = None,
         dir_filter: t.Callable[[Path], bool] | None = None,
+        max_file_count: t.Optional[int] = None,
         file_filter: t.Callable[[Path], bool] | None = None,
+        slash_after_dir: bool = True,
+        ellipsis_after_max_depth: bool = True,
+        ellipsis_after_max_files: bool = True,
+        skip_if_no_permission: bool = True,
+        include: t.Sequence[str] = (),
+        exclude: t.Sequence[str] = (),
+        gitignore: bool = False,
+        sort: t.Optional[str] = "name",
+        dirs_first: bool = False,
+    ):
+        if recursive is False:
+            max_dir_depth = 1
+
+        self.root_path = str(Path(path).resolve())
+        self._builder = _DirTreeBuilder(
+            max_depth=max_dir_depth,
+            max_files=max_file_count,
+            dir_filter=dir_filter,
+            file_filter=file_filter,
+            slash_after_dir=slash_after_dir,
+            ellipsis_after_max_depth=ellipsis_after_max_depth,
+            ellipsis_after_max_files=ellipsis_after_max_files,
+            skip_if_no_permission=skip_if_no_permission,
+            pattern_filter=_pattern_filter(
+                self.root_path, include, exclude, gitignore
+            ),
+            sort=sort,
+            dirs_first=dirs_first,
+        )
+        # path -> the directory as of its last listing, for every directory in
+        # the tree above max_dir_depth
+        self._dirs: t.Dict[str, _WatchedDir] = {}
+        self.tree = self._load(self.root_path, 0)
+
+    def refresh(self) -> t.List[TextRenderNode]:
+        """Re-list the directories that changed since the last refresh.
+
+        Returns:
+            The directory nodes whose display text or children changed, in
+            tree order.  An empty list means the tree is exactly as it was.
+        """
+        dirs = self._dirs
+        changed: t.List[TextRenderNode] = []
+        stack = [self.root_path]
+        while stack:
+            path = stack.pop()
+            watched = dirs.get(path)
+            # dropped when its parent was re-listed earlier in this refresh
+            if watched is None:
+                continue
+            try:
+                signature = self._signature(path)
+            except FileNotFoundError:
+                if path == self.root_path:
+                    raise
+                # its parent's mtime changed too, so it goes on the next refresh
+                continue
+            if signature is None or signature != watched.signature:
+                subdirs = self._relist(path, watched, signature, changed)
+            else:
+                subdirs = watched.subdirs
+            stack.extend(reversed(subdirs))
+        return changed
+
+    def _signature(self, path: str) -> t.Optional[t.Tuple[int, int, int]]:
+        """What must stay the same for a directory's listing to be reused.
+
+        The ctime is included so a change of permissions is noticed.  Returns
+        None for a directory modified too recently to trust its mtime.
+        """
+        started = time.time_ns()
+        stat = os.stat(path)
+        if stat.st_mtime_ns >= started - _MTIME_RESOLUTION_NS:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns
+
+    def _load(self, path: str, depth: int) -> TextRenderNode:
+        """List a directory that isn't in the tree yet, and all below it."""
+        signature = self._signature(path)
+        display, children, subdirs = self._list(path, depth)
+        node = TextRenderNode(display=display, children=children)
+        self._dirs[path] = _WatchedDir(signature, node, depth, subdirs)
+        return node
+
+    def _relist(
+        self,
+        path: str,
+        watched: _WatchedDir,
+        signature: t.Optional[t.Tuple[int, int, int]],
+        changed: t.List[TextRenderNode],
+    ) -> t.List[str]:
+        """List a known directory again and update its node in place.
+
+        Returns the paths of its subdirectories that were already known, as
+        the ones loaded just now don't need checking again.
+        """
+        display, children, subdirs = self._list(path, watched.depth)
+        node = watched.node
+        known = set(watched.subdirs)
+        if subdirs != watched.subdirs:
+            kept = set(subdirs)
+            self._forget(p for p in watched.subdirs if p not in kept)
+            is_changed = True
+        else:
+            is_changed = display != node.display or [
+                child.display for child in children
+            ] != [child.display for child in node.children]
+        if is_changed:
+            node.display = display
+            node.children = children
+            changed.append(node)
+        watched.signature = signature
+        watched.subdirs = subdirs
+        return [p for p in subdirs if p in known]
+
+    def _list(
+        self, path: str, depth: int
+    ) -> t.Tuple[str, t.List[TextRenderNode], t.List[str]]:
+        """List a directory and build its children.
+
+        Known subdirectories keep their nodes; new ones are loaded.  Returns
+        the directory's display text, its children and its subdirectories'
+        paths.
+        """
+        builder = self._builder
+        name = os.path.basename(path)
+        try:
+            entries = builder.list_dir(path)
+        except PermissionError:
+            if not builder.skip_if_no_permission:
+                raise
+            return builder.permission_denied_node(name).display, [], []
+
+        node, subdirs = builder.expand(name, entries, depth, path)
+        children = node.children
+        subdir_paths = []
+        past_max_depth = builder.is_past_max_depth(depth + 1)
+        for index, subdir_path, subdir_name in subdirs:
+            if past_max_depth:
+                children[index] = builder.max_depth_node(subdir_name)
+                continue
+            watched = self._dirs.get(subdir_path)
+            if watched is not None:
+                children[index] = watched.node
+            else:
+                children[index] = self._load(subdir_path, depth + 1)
+            subdir_paths.append(subdir_path)
+        return node.display, children, subdir_paths
+
+    def _forget(self, paths: t.Iterable[str]) -> None:
+        """Drop removed directories, and everything below them."""
+        dirs = self._dirs
+        stack = list(paths)
+        while stack:
+            watched = dirs.pop(stack.pop(), None)
+            if watched is not None:
+                stack.extend(watched.subdirs)
+
+
+def _pattern_filter(
+    root: t.Union[str, Path],
+    include: t.Sequence[str],
+    exclude: t.Sequence[str],
+    gitignore: bool,
+) -> t.Optional[PatternFilter]:
+    if not (include or exclude or gitignore):
+        return None
+    return PatternFilter(root, include=include, exclude=exclude, gitignore=gitignore)
+
+
+# A directory entry: (name, path, is_file, stat).  `is_file` holds the
+# PermissionError instead if the entry's type couldn't be read, and `stat` is
+# the entry's own `os.stat_result`, or None if it wasn't read.
+_DirEntry = t.Tuple[
+    str, str, t.Union[bool, PermissionError], t.Optional[os.stat_result]
+]
+_DirListing = t.List[_DirEntry]
+
+
+def _scan_dir(path: str, with_stat: bool = False) -> _DirListing:
+    """List a directory with `os.scandir`.
+
+    `DirEntry` objects already know their file type on most platforms, so
+    there's no extra `stat` call per entry.  The listing is read in full so the
+    directory handle isn't held open while we recurse into subdirectories.
+
+    With `with_stat`, each entry's stat is read too.  Windows fills it in
+    while listing the directory; elsewhere this costs an `lstat` per entry.
+    """
+    listing: _DirListing = []
+    with os.scandir(path) as scandir_iter:
+        for entry in scandir_iter:
+            stat = None
+            try:
+                is_file: t.Union[bool, PermissionError] = entry.is_file()
+            except PermissionError as e:
+                is_file = e
+            if with_stat and not isinstance(is_file, PermissionError):
+                stat = _lstat(entry)
+            listing.append((entry.name, entry.path, is_file, stat))
+    return listing
+
+
+def _scan_dir_with_stat(path: str) -> _DirListing:
+    return _scan_dir(path, with_stat=True)
+
+
+def _file_size(path: str, stat: t.Optional[os.stat_result]) -> int:
+    """A file's size from its listing's stat, or an `lstat` if it has none."""
+    if stat is None:
+        stat = _lstat(path)
+    return stat.st_size if stat else 0
+
+
+def _lstat(entry: t.Union[os.DirEntry, str]) -> t.Optional[os.stat_result]:
+    """An entry's own stat (a symlink's, not its target's), or None if it's gone."""
+    try:
+        if isinstance(entry, str):
+            return os.lstat(entry)
+        return entry.stat(follow_symlinks=False)
+    except OSError:
+        return None
+
+
+_split_digits = re.compile(r"(\d+)").split
+
+
+def _natural_key(entry: _DirEntry) -> t.Tuple[t.List[t.Any], str]:
+    """Sorts `file2` before `file10`, ignoring case."""
+    name = entry[0]
+    # the runs of digits end up at the odd indices
+    parts: t.List[t.Any] = _split_digits(name.lower())
+    parts[1::2] = map(int, parts[1::2])
+    return parts, name
+
+
+def _size_key(entry: _DirEntry) -> t.Tuple[int, str]:
+    stat = entry[3]
+    return -(stat.st_size if stat else 0), entry[0]
+
+
+def _mtime_key(entry: _DirEntry) -> t.Tuple[int, str]:
+    stat = entry[3]
+    return -(stat.st_mtime_ns if stat else 0), entry[0]
+
+
+# Sort keys for renderable_dir_tree's `sort`, each computed once per entry.
+_SORT_KEYS: t.Dict[str, t.Callable[[_DirEntry], t.Any]] = {
+    "name": operator.itemgetter(0),
+    "natural": _natural_key,
+    "size": _size_key,
+    "mtime": _mtime_key,
+}
+
+# The sorts that need each entry's stat.
+_STAT_SORTS = frozenset(["size", "mtime"])
+
+
+class _DirTreeBuilder:
+    """Turns directory listings into TextRenderNodes for renderable_dir_tree.
+
+    Listing a directory (`_scan_dir`) is kept apart from building its node
+    (`expand`), so the listings can come from a thread pool or an event loop
+    while the tree itself is always assembled in the same order.
+    """
+
+    def __init__(
+        self,
+        max_depth: t.Optional[int],
+        max_files: t.Optional[int],
+        dir_filter: t.Callable[[Path], bool] | None,
+        file_filter: t.Callable[[Path], bool] | None,
+        slash_after_dir: bool,
+        ellipsis_after_max_depth: bool,
+        ellipsis_after_max_files: bool,
+        skip_if_no_permission: bool,
+        executor: t.Optional[Executor] = None,
+        cache: t.Optional[ScanCache] = None,
+        stats: t.Optional[Stats] = None,
+        totals: bool = False,
+        totals_display: t.Optional[t.Callable[[DirRenderNode], str]] = None,
+        pattern_filter: t.Optional[PatternFilter] = None,
+        sort: t.Optional[str] = "name",
+        dirs_first: bool = False,
+    ):
+        if sort is not None and sort not in _SORT_KEYS:
+            raise ValueError(
+                f"Unknown sort {sort!r}; expected one of {sorted(_SORT_KEYS)} or None."
+            )
+        self.max_depth = max_depth
+        self.max_files = max_files
+        self.dir_filter = dir_filter
+        self.file_filter = file_filter
+        self.slash_after_dir = slash_after_dir
+        self.ellipsis_after_max_depth = ellipsis_after_max_depth
+        self.ellipsis_after_max_files = ellipsis_after_max_files
+        self.skip_if_no_permission = skip_if_no_permission
+        self.executor = executor
+        self.cache = cache
+        self.stats = stats
+        self.totals = totals
+        self.totals_display = totals_display
+        self.pattern_filter = pattern_filter
+        self.sort_key = None if sort is None else _SORT_KEYS[sort]
+        self.sort_needs_stat = sort in _STAT_SORTS
+        self.dirs_first = dirs_first
+
+    def build(
+        self,
+        node_path: str,
+        node_name: str,
+        current_depth: int = 0,
+        listing: t.Optional[Future] = None,
     ) -> TextRenderNode:
         """Recursively build a TextRenderNode tree from a given file system path."""
+        node, subdirs = self.visit(node_path, node_name, current_depth, listing)
+        if subdirs is None:
+            return node
+        children = node.children
+        for index, path, name, future in subdirs:
+            children[index] = self.build(path, name, current_depth + 1, future)
+        if self.totals:
+            self.add_totals(node, [children[index] for index, _, _, _ in subdirs])
+        return node
+
+    def build_flat(
+        self,
+        tree: FlatTree,
+        node_path: str,
+        node_name: str,
+        current_depth: int = 0,
+        listing: t.Optional[Future] = None,
+    ) -> FlatTree:
+        """Recursively append rows for a file system path to a FlatTree.
 
+        Only one directory's worth of TextRenderNodes exists at a time.
+        """
+        node, subdirs = self.visit(node_path, node_name, current_depth, listing)
+        tree.append(node.display, current_depth)
+        if subdirs is None:
+            return tree
+        child_depth = current_depth + 1
+        pending = iter(subdirs)
+        for child in node.children:
+            if child is None:
+                _, path, name, future = next(pending)
+                self.build_flat(tree, path, name, child_depth, future)
+            else:
+                tree.append(child.display, child_depth)
+        return tree
+
+    def visit(
+        self,
+        node_path: str,
+        node_name: str,
+        current_depth: int,
+        listing: t.Optional[Future] = None,
+    ) -> t.Tuple[
+        TextRenderNode, t.Optional[t.List[t.Tuple[int, str, str, t.Optional[Future]]]]
+    ]:
+        """List one directory and build its node, minus its subdirectories.
+
+        Returns the node along with the (child index, path, name, listing) of
+        each subdirectory still to be built, or None instead of those if the
+        directory wasn't listed (it's past the max depth, or unreadable).  If
+        an executor is set, the subdirectory listings are all submitted to it
+        here, before the caller descends into the first one.
+        """
         # we've reached max_depth, so we need to stop
-        children: t.List[TextRenderNode] = []
-        if max_depth and current_depth >= max_depth:
-            display = (
-                node_path.name
-                + (" /" * slash_after_dir)
-                + (" ..." * ellipsis_after_max_depth)
-            )
-            return TextRenderNode(display=display, children=children)
+        if self.is_past_max_depth(current_depth):
+            return self.max_depth_node(node_name), None
 
         # Node is a directory, continue building the tree
         try:
-            child_iter = node_path.iterdir()
+            entries = listing.result() if listing else self.list_dir(node_path)
         except PermissionError:
-            if skip_if_no_permission:
-                return TextRenderNode(
-                    display=node_path.name
-                    + f"[Permission Denied]{' /' * slash_after_dir}"
-                )
+            if self.skip_if_no_permission:
+                return self.permission_denied_node(node_name), None
             else:
                 raise
-        permission_error_on_child = False
 
-        current_file_count = 0
-        skipping_remaining_files = False
-        for child_path in child_iter:
-            # Current node is a file
-            try:
-                is_file = child_path.is_file()
-            except PermissionError:
+        node, subdirs = self.expand(node_name, entries, current_depth, node_path)
+
+        if self.executor and not self.is_past_max_depth(current_depth + 1):
+            submit = self.executor.submit
+            return node, [
+                (index, path, name, submit(self.list_dir, path))
+                for index, path, name in subdirs
+            ]
+        return node, [(index, path, name, None) for index, path, name in subdirs]
+
+    def list_dir(self, path: str) -> _DirListing:
+        """List a directory, through the scan cache if there is one."""
+        stats = self.stats
+        if stats is None:
+            return self._list_dir(path)
+
+        start = time.perf_counter()
+        try:
+            listing = self._list_dir(path)
+        except PermissionError:
+            stats.record_listing(0, time.perf_counter() - start, 1)
+            raise
+        stats.record_listing(
+            len(listing),
+            time.perf_counter() - start,
+            sum(
+                isinstance(is_file, PermissionError) for _, _, is_file, _ in listing
+            ),
+        )
+        return listing
+
+    def _list_dir(self, path: str) -> _DirListing:
+        if self.totals or self.sort_needs_stat:
+            # cached listings come back without stats; `expand` reads those
+            scan = _scan_dir_with_stat
+            if self.cache is None:
+                return scan(path)
+            return self.cache.listing(path, scan)
+        if self.cache is None:
+            return _scan_dir(path)
+        return self.cache.listing(path, _scan_dir)
+
+    def is_past_max_depth(self, depth: int) -> bool:
+        return bool(self.max_depth and depth >= self.max_depth)
+
+    def max_depth_node(self, name: str) -> TextRenderNode:
+        display = (
+            name
+            + (" /" * self.slash_after_dir)
+            + (" ..." * self.ellipsis_after_max_depth)
+        )
+        if self.totals:
+            # not listed, so whatever is below it isn't counted
+            return DirRenderNode(display=display, partial=True)
+        return TextRenderNode(display=display)
+
+    def permission_denied_node(self, name: str) -> TextRenderNode:
+        display = name + f"[Permission Denied]{' /' * self.slash_after_dir}"
+        if self.totals:
+            return DirRenderNode(display=display, partial=True)
+        return TextRenderNode(display=display)
+
+    def add_totals(
+        self, node: DirRenderNode, subdir_nodes: t.Iterable[DirRenderNode]
+    ) -> None:
+        """Add a listed directory's subdirectories' totals into its own.
+
+        `expand` has already counted the directory's own files and
+        subdirectories.  This runs once the subdirectories are built, so
+        totals roll up from the bottom of the tree.
+        """
+        for subdir in subdir_nodes:
+            node.size += subdir.size
+            node.file_count += subdir.file_count
+            node.dir_count += subdir.dir_count
+            node.partial = node.partial or subdir.partial
+        if self.totals_display is not None:
+            node.display = self.totals_display(node)
+
+    def expand(
+        self,
+        node_name: str,
+        entries: _DirListing,
+        current_depth: int,
+        node_path: t.Optional[str] = None,
+    ) -> t.Tuple[TextRenderNode, t.List[t.Tuple[int, str, str]]]:
+        """Build the node for a listed directory, minus its subdirectories.
+
+        Returns the node along with the (child index, path, name) of each
+        subdirectory still to be built; its slot in `children` holds None
+        until the caller fills it in.
+        """
+        max_files = self.max_files
+        file_filter = self.file_filter
+        dir_filter = self.dir_filter
+        sort_key = self.sort_key
+        sort_needs_stat = self.sort_needs_stat
+        # tests the directory's entries against the include/exclude patterns
+        is_excluded = None
+        if self.pattern_filter is not None and node_path is not None:
+            is_excluded = self.pattern_filter.for_dir(node_path)
+
+        # In listing order, the files shown are simply the first max_files
+        # that pass the filter, so the filter isn't called for the rest.
+        stop_at_max_files = bool(max_files) and sort_key is None
+
+        totals = self.totals
+        kept: t.List[_DirEntry] = []
+        file_count = 0
+        # files that pass the filters but aren't shown, still in the totals
+        hidden_file_count = 0
+        hidden_size = 0
+        too_many_files = False
+        permission_error_on_child = False
+        for entry in entries:
+            name, path, is_file, stat = entry
+            if isinstance(is_file, PermissionError):
+                if not self.skip_if_no_permission:
+                    raise is_file
                 permission_error_on_child = True
                 continue
+            if is_excluded is not None and is_excluded(name, not is_file):
+                continue
             if is_file:
-                if skipping_remaining_files:
-                    continue
-                current_file_count += 1
-                # We're at the max file count, so we need to stop
-                if max_files and current_file_count > max_files:
-                    # We do want an ellipsis!
-                    if ellipsis_after_max_files:
-                        children.append(TextRenderNode(display="..."))
-                    # Skip the rest of the files in this directory
-                    skipping_remaining_files = True
+                if stop_at_max_files and file_count == max_files:
+                    if totals:
+                        if not file_filter or file_filter(Path(path)):
+                            too_many_files = True
+                            hidden_file_count += 1
+                            hidden_size += _file_size(path, stat)
+                    # one more file that passes the filter earns an ellipsis
+                    elif not too_many_files and (
+                        not file_filter or file_filter(Path(path))
+                    ):
+                        too_many_files = True
                     continue
-                # Check the filter...
-                if file_filter and not file_filter(child_path):
+                if file_filter and not file_filter(Path(path)):
                     continue
-                # Add the file to the tree
-                children.append(TextRenderNode(display=child_path.name))
-            else:
-                # Current node is a directory
-                if dir_filter and not dir_filter(child_path):
-                    continue
-                try:
-                    child_node = _build_tree(
-                        child_path,
-                        current_depth + 1,
-                        max_depth,
-                        max_files,
-                        dir_filter,
-                        file_filter,
-                    )
-                except PermissionError:
-                    permission_error_on_child = True
-                    continue
-                else:
-                    children.append(child_node)
-        if permission_error_on_child:
-            if skip_if_no_permission:
-                children.append(TextRenderNode(display="[Permission Denied]"))
+                file_count += 1
+            elif dir_filter and not dir_filter(Path(path)):
+                continue
+            if sort_needs_stat and stat is None:
+                entry = (name, path, is_file, _lstat(path))
+            kept.append(entry)
+
+        if sort_key is not None:
+            if max_files and file_count > max_files:
+                # only the first max_files files are shown, so rather than
+                # sorting every file, pick them out with a bounded heap
+                too_many_files = True
+                dirs = [entry for entry in kept if not entry[2]]
+                files = heapq.nsmallest(
+                    max_files, (entry for entry in kept if entry[2]), key=sort_key
+                )
+                if totals:
+                    shown = set(map(id, files))
+                    for entry in kept:
+                        if entry[2] and id(entry) not in shown:
+                            hidden_file_count += 1
+                            hidden_size += _file_size(entry[1], entry[3])
+                kept = dirs + files
+            if self.dirs_first:
+                kept.sort(key=lambda entry: (entry[2], sort_key(entry)))
             else:
-                raise
+                kept.sort(key=sort_key)
+        elif self.dirs_first:
+            kept.sort(key=operator.itemgetter(2))
 
-        display = node_path.name + (" /" * slash_after_dir)
-        return TextRenderNode(display=display, children=children)
+        size_total = hidden_size
+        children: t.List[t.Any] = []
+        subdirs: t.List[t.Tuple[int, str, str]] = []
+        for name, path, is_file, stat in kept:
+            if is_file:
+                children.append(TextRenderNode(display=name))
+                if totals:
+                    size_total += _file_size(path, stat)
+            else:
+                subdirs.append((len(children), path, name))
+                children.append(None)
+        shown_file_count = len(children) - len(subdirs)
+        if too_many_files and self.ellipsis_after_max_files:
+            children.append(TextRenderNode(display="..."))
+        if permission_error_on_child:
+            children.append(TextRenderNode(display="[Permission Denied]"))
 
-    root_path = Path(path).resolve()
-    return _build_tree(
-        root_path,
-        0,
-        max_dir_depth,
-        max_file_count,
-        dir_filter,
-        file_filter,
-    )
+        display = node_name + (" /" * self.slash_after_dir)
+        if totals:
+            return (
+                DirRenderNode(
+                    display=display,
+                    children=children,
+                    size=size_total,
+                    file_count=shown_file_count + hidden_file_count,
+                    dir_count=len(subdirs),
+                    partial=permission_error_on_child,
+                ),
+                subdirs,
+            )
+        return TextRenderNode(display=display, children=children), subdirs
 
 
 def render(
@@ -335,6 +1531,13 @@ def render(
     style: styles.TextRenderStyle = styles.solid_line_style,
     width: int = 1,
     spacing: int = 1,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+    max_lines: t.Optional[int] = None,
+    max_bytes: t.Optional[int] = None,
+    stats: t.Optional[Stats] = None,
+    workers: t.Optional[int] = None,
+    split_depth: int = 1,
 ) -> str:
     """Render a tree made up of TextRenderNodes as a multiline string.
 
@@ -346,6 +1549,10 @@ def render(
     will create an interface for any tree-structured object.  Just supply an
     attribute name or method to map to the `display` and `children` attributes.
 
+    This is a convenience wrapper around `iter_render`; for very large trees,
+    prefer `iter_render` or `render_to` so the output never has to be held in
+    memory all at once.
+
     Args:
         node: The root node of the tree to render.  If you need multiple roots,
             it's best to render them separately and then join the results.
@@ -354,77 +1561,570 @@ def render(
         width: The width of the horizontal lines in the tree. Defaults to 1.
         spacing: The number of spaces to use between the horizontal line
             and the node's display text. Defaults to 1.
+        max_depth: The deepest level to render, where the root is level 0.
+            The children of nodes at this level are never accessed. Defaults
+            to None (no limit).
+        max_children: The maximum number of children to render per node.  Any
+            further children are summarized by a single "... N more" line.
+            Defaults to None (no limit).
+        max_lines: Stop rendering after this many lines. Defaults to None
+            (no limit).
+        max_bytes: Stop rendering before the UTF-8 encoded output would
+            exceed this many bytes. Defaults to None (no limit).
+        stats: A Stats to record the render time and the lines and bytes
+            rendered in.  Defaults to None.
+        workers: The number of processes to render a FlatTree with.  The
+            rows down to `split_depth` are rendered in this process, and the
+            subtrees below them are rendered in a process pool and joined in
+            order; the output is identical to a serial render.  Only
+            FlatTrees are supported, since their rows are sent to the pool as
+            array slices; pickling a tree of nodes costs more than rendering
+            it.  Ignored when `max_lines` or `max_bytes` is set.  Defaults to
+            None (render in this process).
+        split_depth: The depth at which to split the tree between processes
+            when `workers` is set.  Use a deeper split when the top levels
+            have only a few children each.  Defaults to 1.
+    """
+    if workers is not None and workers > 1:
+        if not isinstance(node, FlatTree):
+            raise ValueError(
+                "Rendering with workers needs a FlatTree; "
+                "use FlatTree.from_node to convert the tree."
+            )
+        if split_depth < 1:
+            raise ValueError(f"split_depth must be at least 1, not {split_depth}.")
+        if max_lines is None and max_bytes is None:
+            glyphs = styles.compile_style(
+                style if style else styles.solid_line_style, width, spacing
+            )
+            if stats is None:
+                return node._render_parallel(
+                    glyphs, max_depth, max_children, workers, split_depth
+                )
+            with stats.phase("render"):
+                output = node._render_parallel(
+                    glyphs, max_depth, max_children, workers, split_depth
+                )
+            stats.lines += output.count("\n")
+            stats.bytes += len(output.encode("utf-8"))
+            return output
+
+    return "".join(
+        iter_render(
+            node,
+            style=style,
+            width=width,
+            spacing=spacing,
+            max_depth=max_depth,
+            max_children=max_children,
+            max_lines=max_lines,
+            max_bytes=max_bytes,
+            stats=stats,
+        )
+    )
+
+
+def iter_render(
+    node: TextRenderNode,
+    style: styles.TextRenderStyle = styles.solid_line_style,
+    width: int = 1,
+    spacing: int = 1,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+    max_lines: t.Optional[int] = None,
+    max_bytes: t.Optional[int] = None,
+    stats: t.Optional[Stats] = None,
+) -> t.Iterator[str]:
+    """Render a tree one line at a time.
+
+    Each yielded string is a single line of output, including its trailing
+    newline, so `"".join(iter_render(node))` is identical to `render(node)`.
+    Lines are produced as the tree is walked, so the first line is available
+    immediately and memory use is bounded by the depth of the tree rather than
+    the size of the output.
+
+    Nodes are only visited as their lines are needed, so when a limit cuts the
+    output short the rest of the tree is never touched.
+
+    Args:
+        node: The root node of the tree to render.
+        style: The style to use when rendering the tree.  If not provided, a
+            solid line style will be used.
+        width: The width of the horizontal lines in the tree. Defaults to 1.
+        spacing: The number of spaces to use between the horizontal line
+            and the node's display text. Defaults to 1.
+        max_depth: The deepest level to render, where the root is level 0.
+        max_children: The maximum number of children to render per node.
+        max_lines: Stop rendering after this many lines.
+        max_bytes: Stop rendering before the UTF-8 encoded output would
+            exceed this many bytes.
+        stats: A Stats to record the render time and the lines and bytes
+            rendered in.
 
-    Protected Args:
-        _prefix: The lefthand decoration to use when rendering the current node.
-        _is_last_sibling: Whether the current node is the last child of its
-            parent.
-        _is_root: Whether the current node is the root of the tree.
+    Yields:
+        The lines of the rendered tree, each ending in a newline.
     """
-    return _recursive_render(
+    if isinstance(node, FlatTree):
+        glyphs = styles.compile_style(
+            style if style else styles.solid_line_style, width, spacing
+        )
+        lines = node._iter_lines(glyphs, max_depth, max_children)
+    else:
+        lines = _render_lines(
+            node, style, width, spacing, max_depth, max_children
+        )
+    if max_lines is not None:
+        lines = itertools.islice(lines, max_lines)
+    if max_bytes is not None:
+        lines = _limit_bytes(lines, max_bytes)
+    if stats is not None:
+        lines = stats.count_lines(lines)
+    return lines
+
+
+def iter_render_bytes(
+    node: TextRenderNode,
+    style: styles.TextRenderStyle = styles.solid_line_style,
+    width: int = 1,
+    spacing: int = 1,
+    encoding: str = "utf-8",
+    chunk_size: int = 1 << 16,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+    max_lines: t.Optional[int] = None,
+    max_bytes: t.Optional[int] = None,
+    stats: t.Optional[Stats] = None,
+    end: str = "",
+) -> t.Iterator[bytes]:
+    """Render a tree as encoded chunks, ready to write to a binary stream.
+
+    Lines are gathered into chunks of about `chunk_size` characters, each
+    encoded with a single call, so there's no per-line encoding or write
+    overhead and no more than one chunk is held in memory.  The first line is
+    yielded on its own, so output starts as soon as rendering does.  Chunks
+    always end on a line boundary.
+
+    Args:
+        node: The root node of the tree to render.
+        style, width, spacing: See `render`.
+        encoding: The encoding to use. Defaults to "utf-8".
+        chunk_size: Roughly how many characters to encode at a time.
+            Defaults to 64 KiB.
+        max_depth, max_children, max_lines, max_bytes, stats: See `render`.
+        end: Text to add after the tree (say, a blank line and a summary),
+            encoded along with it.  Defaults to nothing.
+
+    Yields:
+        The encoded output, in chunks of whole lines.
+    """
+    lines = iter_render(
         node,
         style=style,
         width=width,
         spacing=spacing,
+        max_depth=max_depth,
+        max_children=max_children,
+        max_lines=max_lines,
+        max_bytes=max_bytes,
+        stats=stats,
     )
+    if end:
+        lines = itertools.chain(lines, [end])
+    # an incremental encoder writes a byte order mark (for the encodings that
+    # have one) only at the start, not at every chunk
+    encode = codecs.getincrementalencoder(encoding)().encode
+    for chunk in _join_lines(lines, chunk_size):
+        yield encode(chunk)
+
+
+def render_to(
+    node: TextRenderNode,
+    fp: t.IO,
+    style: styles.TextRenderStyle = styles.solid_line_style,
+    width: int = 1,
+    spacing: int = 1,
+    encoding: str = "utf-8",
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+    max_lines: t.Optional[int] = None,
+    max_bytes: t.Optional[int] = None,
+    stats: t.Optional[Stats] = None,
+    end: str = "",
+) -> None:
+    """Render a tree directly into a file object.
+
+    Output is written as it's produced, in chunks of about 64 KiB of whole
+    lines (the first line goes out on its own), so the full output is never
+    held in memory.
+
+    Args:
+        node: The root node of the tree to render.
+        fp: A writable file object.  Text files receive `str`; binary files
+            (and anything opened with a "b" mode) receive the output encoded
+            with `encoding`.
+        style: The style to use when rendering the tree.
+        width: The width of the horizontal lines in the tree. Defaults to 1.
+        spacing: The number of spaces to use between the horizontal line
+            and the node's display text. Defaults to 1.
+        encoding: The encoding used when writing to a binary file.  Ignored
+            for text files.  Defaults to "utf-8".
+        max_depth: See `render`.
+        max_children: See `render`.
+        max_lines: See `render`.
+        max_bytes: See `render`.
+        stats: See `render`.
+        end: Text to write after the tree, such as a summary.  For binary
+            files it goes through the same encoder as the tree, so encodings
+            with a byte order mark only get one.  Defaults to nothing.
+    """
+    options = dict(
+        style=style,
+        width=width,
+        spacing=spacing,
+        max_depth=max_depth,
+        max_children=max_children,
+        max_lines=max_lines,
+        max_bytes=max_bytes,
+        stats=stats,
+    )
+    write = fp.write
+    if _is_binary_file(fp):
+        for chunk in iter_render_bytes(node, encoding=encoding, end=end, **options):
+            write(chunk)
+    else:
+        lines = iter_render(node, **options)
+        if end:
+            lines = itertools.chain(lines, [end])
+        for chunk in _join_lines(lines, 1 << 16):
+            write(chunk)
+
+
+def render_json(
+    node: TextRenderNode,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+) -> str:
+    """Serialize a tree as a single nested JSON document.
+
+    This is a convenience wrapper around `iter_json`; for very large trees,
+    prefer `iter_json`, `iter_ndjson` or `write_json` so the output never has
+    to be held in memory all at once.
+
+    Args:
+        node: The root node of the tree, or a FlatTree.
+        max_depth: See `render`.
+        max_children: See `render`.
+    """
+    return "".join(iter_json(node, max_depth=max_depth, max_children=max_children))
+
+
+def iter_json(
+    node: TextRenderNode,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+) -> t.Iterator[str]:
+    """Serialize a tree as nested JSON, one node at a time.
+
+    Each node is an object with its `display` text and, if any are shown, a
+    list of `children`.  DirRenderNodes also have their `size`,
+    `file_count` and `dir_count`, and `"partial": true` if those are partial.  When `max_children` hides some of a
+    node's children, the node gets a `more` member with how many.
+
+    The tree is walked in the same order as `iter_render`, with the same
+    limits, and each yielded string holds a single node (plus the brackets
+    closing the nodes before it), so the document is never built in memory.
+    `"".join(iter_json(node))` is the whole document, ending in a newline.
+
+    Args:
+        node: The root node of the tree, or a FlatTree.
+        max_depth: See `render`.
+        max_children: See `render`.
+
+    Yields:
+        Pieces of the JSON document.
+    """
+    # the state of each open node's "children" list: 0 if not started yet,
+    # 1 if open, 2 if closed by a "more" member
+    open_nodes: t.List[int] = []
+    for depth, item in _walk(node, max_depth, max_children):
+        pieces = []
+        while len(open_nodes) > depth:
+            pieces.append("]}" if open_nodes.pop() == 1 else "}")
+        if type(item) is int:
+            if open_nodes[-1] == 1:
+                pieces.append("]")
+            open_nodes[-1] = 2
+            pieces.append(f', "more": {item}')
+        else:
+            if open_nodes:
+                pieces.append(", " if open_nodes[-1] == 1 else ', "children": [')
+                open_nodes[-1] = 1
+            pieces.append(f"{{{_json_members(item)}")
+            open_nodes.append(0)
+        yield "".join(pieces)
+    closing = ["]}" if state == 1 else "}" for state in reversed(open_nodes)]
+    yield "".join(closing) + "\n"
+
+
+def iter_ndjson(
+    node: TextRenderNode,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+) -> t.Iterator[str]:
+    """Serialize a tree as newline-delimited JSON, one node per line.
+
+    Lines come in the same order as the lines of `iter_render`, with the
+    same limits.  Each is an object with the node's `depth` (the root is 0)
+    and `display` text; DirRenderNodes also have their `size`, `file_count`
+    and `dir_count`.  Children hidden by `max_children` are summarized by a
+    `{"depth": ..., "more": N}` line after the ones shown, in place of the
+    "... N more" line of the text rendering.
 
+    Args:
+        node: The root node of the tree, or a FlatTree.
+        max_depth: See `render`.
+        max_children: See `render`.
+
+    Yields:
+        One JSON object per line, each ending in a newline.
+    """
+    for depth, item in _walk(node, max_depth, max_children):
+        if type(item) is int:
+            yield f'{{"depth": {depth}, "more": {item}}}\n'
+        else:
+            yield f'{{"depth": {depth}, {_json_members(item)}}}\n'
 
-def _recursive_render(
+
+def write_json(
+    node: TextRenderNode,
+    fp: t.IO,
+    ndjson: bool = False,
+    encoding: str = "utf-8",
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+) -> None:
+    """Serialize a tree as JSON directly into a file object.
+
+    Output is written in chunks of about 64 KiB as it's produced, like
+    `render_to`.
+
+    Args:
+        node: The root node of the tree, or a FlatTree.
+        fp: A writable file object, text or binary; see `render_to`.
+        ndjson: Write one object per line, as `iter_ndjson` does, rather than
+            a nested document, as `iter_json` does.  Defaults to False.
+        encoding: The encoding used when writing to a binary file.  Ignored
+            for text files.  Defaults to "utf-8".
+        max_depth: See `render`.
+        max_children: See `render`.
+    """
+    serialize = iter_ndjson if ndjson else iter_json
+    chunks = _join_lines(serialize(node, max_depth, max_children), 1 << 16)
+    write = fp.write
+    if _is_binary_file(fp):
+        encode = codecs.getincrementalencoder(encoding)().encode
+        for chunk in chunks:
+            write(encode(chunk))
+    else:
+        for chunk in chunks:
+            write(chunk)
+
+
+_encode_json_string = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _json_members(node: t.Any) -> str:
+    """The JSON members for a node: its display text, and totals if it has any.
+
+    `node` is a Renderable, or a FlatTree row's display text.
+    """
+    if type(node) is str:
+        return f'"display": {_encode_json_string(node)}'
+    display = _encode_json_string(node.display)
+    if isinstance(node, DirRenderNode):
+        return (
+            f'"display": {display}, "size": {node.size}, '
+            f'"file_count": {node.file_count}, "dir_count": {node.dir_count}'
+            + (', "partial": true' if node.partial else "")
+        )
+    return f'"display": {display}'
+
+
+def _walk(
+    node: TextRenderNode,
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+) -> t.Iterator[t.Tuple[int, t.Any]]:
+    """Walk a tree in the order `iter_render` draws it, with the same limits.
+
+    Yields (depth, node) for each node shown (for a FlatTree, the node is
+    its display text), and after the children shown of a node whose
+    children were cut short by `max_children`, (depth of the children,
+    number hidden).  Like `_render_lines`, this uses an explicit stack, and
+    never touches children past a limit.
+    """
+    if isinstance(node, FlatTree):
+        yield from node._iter_rows(max_depth, max_children)
+        return
+
+    yield 0, node
+    if max_depth is not None and max_depth < 1:
+        return
+    children = _children_of(node)
+    if not children:
+        return
+
+    # each frame is [children iterator, children left to walk, children
+    # hidden by max_children]
+    stack: t.List[t.List[t.Any]] = []
+
+    def push(children: t.Sequence[TextRenderNode]):
+        count = len(children)
+        hidden = 0
+        if max_children is not None and count > max_children:
+            hidden = count - max_children
+            count = max_children
+        stack.append([iter(children), count, hidden])
+
+    push(children)
+    while stack:
+        frame = stack[-1]
+        if not frame[1]:
+            stack.pop()
+            if frame[2]:
+                yield len(stack) + 1, frame[2]
+            continue
+        frame[1] -= 1
+        child = next(frame[0])
+        depth = len(stack)
+        yield depth, child
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        if type(child) is TextRenderNode:
+            grandchildren = child._children
+        else:
+            grandchildren = child.children
+        if grandchildren:
+            push(grandchildren)
+
+
+def _join_lines(lines: t.Iterable[str], chunk_size: int) -> t.Iterator[str]:
+    """Join lines into strings of about `chunk_size` characters.
+
+    The first line is passed through alone, so output can start right away.
+    """
+    lines = iter(lines)
+    for first in lines:
+        yield first
+        break
+    batch: t.List[str] = []
+    length = 0
+    for line in lines:
+        batch.append(line)
+        length += len(line)
+        if length >= chunk_size:
+            yield "".join(batch)
+            batch = []
+            length = 0
+    if batch:
+        yield "".join(batch)
+
+
+def _is_binary_file(fp: t.IO) -> bool:
+    """Guess whether `fp` expects bytes rather than str."""
+    if isinstance(fp, io.TextIOBase):
+        return False
+    if isinstance(fp, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    return "b" in getattr(fp, "mode", "")
+
+
+def _limit_bytes(lines: t.Iterable[str], max_bytes: int) -> t.Iterator[str]:
+    """Pass lines through until their UTF-8 size would exceed `max_bytes`."""
+    budget = max_bytes
+    for line in lines:
+        budget -= len(line) if line.isascii() else len(line.encode("utf-8"))
+        if budget < 0:
+            return
+        yield line
+
+
+def _render_lines(
     node: TextRenderNode,
     style: styles.TextRenderStyle,
     width: int,
     spacing: int,
-    _prefix: str = "",
-    _is_last_sibling: bool = True,
-    _is_root: bool = True,
-) -> str:
-    """See `render_tree`.
+    max_depth: t.Optional[int] = None,
+    max_children: t.Optional[int] = None,
+) -> t.Iterator[str]:
+    """See `iter_render`.
 
-    This function only exists to hide the recursion arguments from the
-    public API.
+    The tree is walked with an explicit stack rather than recursion, so the
+    depth of the tree is limited only by available memory.  The lefthand
+    prefix is kept as a single string that grows by one segment when we
+    descend into a node's children and is trimmed back when we return, so
+    ancestors share it instead of rebuilding it at every level, and memory
+    use grows with the depth of the tree, not its square.
     """
 
-    style = style if style else styles.solid_line_style
-    children = node.children
-    child_count = len(children)
+    glyphs = styles.compile_style(
+        style if style else styles.solid_line_style, width, spacing
+    )
+    tee, corner, vline, blank = glyphs
 
-    if _is_root:
-        tree_repr = node.display + "\n"
-        new_prefix = _prefix
-    else:
-        tree_repr = _prefix
-        if _is_last_sibling:
-            tree_repr = "".join(
-                (
-                    tree_repr,
-                    style.corner,
-                    (style.hline * width),
-                    (" " * spacing),
-                )
-            )
-            new_prefix = _prefix + " " * (width + spacing + 1)
+    yield f"{node.display}\n"
+
+    if max_depth is not None and max_depth < 1:
+        return
+    children = _children_of(node)
+    if not children:
+        return
+
+    # each frame is [children iterator, children left to render, prefix
+    # length added when descending into this level, children hidden by
+    # max_children]
+    stack: t.List[t.List[t.Any]] = []
+
+    def push(children: t.Sequence[TextRenderNode], segment_length: int):
+        count = len(children)
+        hidden = 0
+        if max_children is not None and count > max_children:
+            hidden = count - max_children
+            count = max_children
+        stack.append([iter(children), count, segment_length, hidden])
+
+    prefix = ""
+    push(children, 0)
+    while stack:
+        frame = stack[-1]
+        remaining = frame[1]
+        if not remaining:
+            if frame[3]:
+                yield f"{prefix}{corner}... {frame[3]} more\n"
+            stack.pop()
+            if frame[2]:
+                prefix = prefix[: -frame[2]]
+            continue
+        remaining -= 1
+        frame[1] = remaining
+        child = next(frame[0])
+
+        if remaining or frame[3]:
+            yield f"{prefix}{tee}{child.display}\n"
+            segment = vline
         else:
-            tree_repr = "".join(
-                (
-                    tree_repr,
-                    style.tee,
-                    (style.hline * width),
-                    (" " * spacing),
-                )
-            )
-            new_prefix = _prefix + style.vline + " " * (width + spacing)
-
-        tree_repr += node.display + "\n"
-
-    for i, child in enumerate(children):
-        tree_repr += _recursive_render(
-            child,
-            style,
-            width,
-            spacing,
-            new_prefix,
-            i == child_count - 1,
-            _is_root=False,
-        )
+            yield f"{prefix}{corner}{child.display}\n"
+            segment = blank
 
-    return tree_repr
+        if max_depth is not None and len(stack) >= max_depth:
+            continue
+        # skip the `children` property for plain TextRenderNodes, so leaves
+        # keep sharing the empty tuple instead of each getting a list
+        if type(child) is TextRenderNode:
+            grandchildren = child._children
+        else:
+            grandchildren = child.children
+        if grandchildren:
+            prefix += segment
+            push(grandchildren, len(segment))
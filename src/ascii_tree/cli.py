@@ -1,12 +1,28 @@
 import argparse
+import os
+import sys
+import time
 
-from ascii_tree import renderable_dir_tree, render, styles
+from ascii_tree import (
+    DirTreeWatcher,
+    RenderCache,
+    Stats,
+    display_with_totals,
+    format_size,
+    renderable_dir_tree,
+    render_to,
+    styles,
+    write_json,
+)
 
 from pathlib import Path
 import fnmatch
 
+# Moves the cursor home and clears the terminal before each redraw.
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
 
-def main():
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Generate and display an ASCII representation of a directory structure."
     )
@@ -45,6 +61,43 @@ def main():
         default=None,
         help="Glob pattern to filter files (e.g., '*.json')."
     )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Only show files matching this .gitignore-style pattern. "
+        "Can be given more than once."
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Leave out files and directories matching this .gitignore-style "
+        "pattern; excluded directories are never read. Can be given more "
+        "than once."
+    )
+    parser.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="Leave out what .gitignore files in the tree ignore, and .git "
+        "directories."
+    )
+    parser.add_argument(
+        "--sort",
+        type=str,
+        default="name",
+        choices=["name", "natural", "size", "mtime", "none"],
+        help="Order of the entries in each directory: by name, natural (file2 "
+        "before file10), size (largest first), mtime (newest first) or none "
+        "(as listed by the file system). Defaults to 'name'."
+    )
+    parser.add_argument(
+        "--dirs-first",
+        action="store_true",
+        help="List directories before files."
+    )
     parser.add_argument(
         "--no-slash",
         action="store_false",
@@ -69,6 +122,71 @@ def main():
         dest="skip_if_no_permission",
         help="Do not skip nodes where permission is denied; raise an error instead."
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of threads used to list directories. Defaults to 1."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Cache file of directory listings, reused for directories that "
+        "haven't changed since the last run."
+    )
+    parser.add_argument(
+        "--du",
+        action="store_true",
+        help="Show the number and total size of the files below each directory, "
+        "including files hidden by --max-files. Totals that stop at --max-depth "
+        "are shown as 'at least'."
+    )
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help="End with the number of directories and files in the tree, "
+        "counted like --du."
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        nargs="?",
+        const=2.0,
+        default=None,
+        metavar="INTERVAL",
+        help="Keep watching the directory, redrawing the tree when it changes. "
+        "Polls every INTERVAL seconds. Defaults to 2."
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="text",
+        choices=["text", "json", "ndjson"],
+        help="Output format: the drawn tree, one nested JSON document, or one "
+        "JSON object per line (NDJSON). With --du, JSON output includes each "
+        "directory's size and counts. Defaults to 'text'."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Write the tree to FILE instead of stdout."
+    )
+    parser.add_argument(
+        "--encoding",
+        type=str,
+        default=None,
+        help="Encoding of the output. Defaults to stdout's encoding, or "
+        "UTF-8 when writing to a file."
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print counts and timings for the scan and render to stderr."
+    )
     styles_ = list(styles.styles_dict.keys())
     parser.add_argument(
         "--style",
@@ -90,7 +208,7 @@ def main():
         help="Spacing between horizontal lines and node display text. Defaults to 1."
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Convert dir_pattern and file_pattern arguments to callable functions
     def dir_filter(path: Path) -> bool:
@@ -99,29 +217,138 @@ def main():
     def file_filter(path: Path) -> bool:
         return fnmatch.fnmatch(path.name, args.file_pattern) if args.file_pattern else True
 
+    tree_options = dict(
+        path=args.path,
+        recursive=args.recursive,
+        max_dir_depth=args.max_depth,
+        dir_filter=dir_filter,
+        max_file_count=args.max_files,
+        file_filter=file_filter,
+        slash_after_dir=args.slash_after_dir,
+        ellipsis_after_max_depth=args.ellipsis_after_max_depth,
+        ellipsis_after_max_files=args.ellipsis_after_max_files,
+        skip_if_no_permission=args.skip_if_no_permission,
+        include=args.include,
+        exclude=args.exclude,
+        gitignore=args.gitignore,
+        sort=None if args.sort == "none" else args.sort,
+        dirs_first=args.dirs_first,
+    )
+    style = styles.styles_dict[args.style]
+
+    if args.watch is not None:
+        if args.du or args.summary:
+            parser.error("--du and --summary can't be combined with --watch")
+        if args.format != "text":
+            parser.error("--format json and ndjson can't be combined with --watch")
+        if args.jobs is not None or args.cache or args.stats:
+            # the watcher relists only changed directories, in this thread
+            parser.error("--jobs, --cache and --stats can't be combined with --watch")
+        if args.output or args.encoding:
+            # redraws go to the terminal, in its own encoding
+            parser.error("--output and --encoding can't be combined with --watch")
+        watch(tree_options, style, args.width, args.spacing, args.watch)
+        return
+
+    if args.summary and args.format != "text":
+        parser.error("--summary only applies to --format text")
+
     # Generate the directory tree
     try:
+        stats = Stats() if args.stats else None
         tree = renderable_dir_tree(
-            path=args.path,
-            recursive=args.recursive,
-            max_dir_depth=args.max_depth,
-            dir_filter=dir_filter,
-            max_file_count=args.max_files,
-            file_filter=file_filter,
-            slash_after_dir=args.slash_after_dir,
-            ellipsis_after_max_depth=args.ellipsis_after_max_depth,
-            ellipsis_after_max_files=args.ellipsis_after_max_files,
-            skip_if_no_permission=args.skip_if_no_permission,
+            **tree_options,
+            workers=args.jobs,
+            cache=args.cache,
+            stats=stats,
+            totals=args.summary or (args.du and args.format != "text"),
+            totals_display=(
+                display_with_totals if args.du and args.format == "text" else None
+            ),
         )
+        footer = summary(tree, args.du) if args.summary else ""
 
-        # Render the tree to an ASCII string
-        style = styles.styles_dict[args.style]
-        output = render(tree, style=style, width=args.width, spacing=args.spacing)
+        # Stream the output straight to the output's binary buffer
+        render_options = dict(
+            style=style, width=args.width, spacing=args.spacing, stats=stats
+        )
+        if args.format != "text":
+            # JSON output carries the totals as members, not in the display
+            ndjson = args.format == "ndjson"
+            if args.output:
+                with open(args.output, "wb") as fp:
+                    write_json(tree, fp, ndjson, args.encoding or "utf-8")
+            else:
+                encoding = args.encoding or sys.stdout.encoding or "utf-8"
+                sys.stdout.flush()
+                write_json(tree, sys.stdout.buffer, ndjson, encoding)
+                sys.stdout.flush()
+        elif args.output:
+            with open(args.output, "wb") as fp:
+                encoding = args.encoding or "utf-8"
+                end = f"\n{footer}\n" if footer else ""
+                render_to(tree, fp, encoding=encoding, end=end, **render_options)
+        else:
+            encoding = args.encoding or sys.stdout.encoding or "utf-8"
+            # keep the blank line that print() used to add
+            end = f"\n{footer}\n" if footer else "\n"
+            sys.stdout.flush()
+            render_to(
+                tree, sys.stdout.buffer, encoding=encoding, end=end, **render_options
+            )
+            sys.stdout.flush()
 
-        print(output)
+        if stats is not None:
+            print(stats.summary(), file=sys.stderr)
+    except BrokenPipeError:
+        # The reader went away (say, `dir-tree big | head`).  Point stdout at
+        # devnull so the interpreter's final flush doesn't fail too.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
     except Exception as e:
         print(f"Error generating directory tree: {e}")
         raise
 
+
+def summary(tree, show_size):
+    """A footer like `3 directories, 12 files`, from the root's totals.
+
+    It starts with "at least" when some directories weren't listed (past
+    --max-depth, or unreadable).
+    """
+    dirs = "directory" if tree.dir_count == 1 else "directories"
+    files = "file" if tree.file_count == 1 else "files"
+    text = f"{tree.dir_count:,} {dirs}, {tree.file_count:,} {files}"
+    if show_size:
+        text += f", {format_size(tree.size)}"
+    if tree.partial:
+        text = f"at least {text}"
+    return text
+
+
+def watch(tree_options, style, width, spacing, interval):
+    """Redraw the tree every time the directory changes, until interrupted.
+
+    Only directories whose mtime changed are listed again, and only their
+    part of the output is re-rendered.
+    """
+    watcher = DirTreeWatcher(**tree_options)
+    cache = RenderCache(style=style, width=width, spacing=spacing)
+    clear = CLEAR_SCREEN if sys.stdout.isatty() else ""
+    try:
+        print(clear + cache.render(watcher.tree), flush=True)
+        while True:
+            time.sleep(interval)
+            changed = watcher.refresh()
+            if changed:
+                cache.invalidate(*changed)
+                print(clear + cache.render(watcher.tree), flush=True)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # as in main(): the reader went away, so stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
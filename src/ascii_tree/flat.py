@@ -0,0 +1,390 @@
+"""Compact, array-backed storage for very large trees."""
+from __future__ import annotations
+
+import sys
+import typing as t
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from ascii_tree import styles
+
+if t.TYPE_CHECKING:
+    from ascii_tree import Renderable, TextRenderNode
+
+
+__all__ = ["FlatTree"]
+
+
+class FlatTree:
+    """A tree stored as parallel arrays, one row per node in depth-first order.
+
+    A FlatTree holds no per-node Python objects.  Each row is described by:
+
+    - `depths[i]`: the depth of the node (the root is 0)
+    - `last_flags[i]`: 1 if the node is the last child of its parent
+    - the node's display text, stored UTF-8 encoded in a single shared buffer
+      and located by `offsets[i]:offsets[i + 1]`
+
+    That costs about 13 bytes per node plus the text itself, compared to
+    several hundred for a TextRenderNode and its children list.
+
+    Rows must be appended in depth-first order, so each new row is either a
+    child of the previous row or a sibling of it or one of its ancestors.
+    Sibling flags are maintained automatically as rows are appended.
+
+    Pass a FlatTree straight to `render`, `iter_render` or `render_to`, or to
+    the JSON serializers, `iter_json`, `iter_ndjson` and `write_json`.
+    """
+
+    __slots__ = ("depths", "last_flags", "offsets", "_buffer", "_open_rows")
+
+    def __init__(self):
+        self.depths = array("I")
+        self.last_flags = bytearray()
+        self.offsets = array("Q", [0])
+        self._buffer = bytearray()
+        # the most recent row at each depth along the current path; it stays
+        # "last" until a sibling is appended after it
+        self._open_rows: t.List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.depths)
+
+    def append(self, display: str, depth: int) -> int:
+        """Add a node after the current last row and return its row index.
+
+        Args:
+            display: The node's display text.
+            depth: The node's depth.  It must be 0 for the first row, and at
+                most one more than the depth of the previous row after that.
+        """
+        open_rows = self._open_rows
+        if depth > len(open_rows) or (depth == 0 and self.depths):
+            raise ValueError(
+                f"Can't add a node at depth {depth} after a node at depth "
+                f"{len(open_rows) - 1}."
+            )
+        row = len(self.depths)
+        if depth < len(open_rows):
+            self.last_flags[open_rows[depth]] = 0
+            del open_rows[depth:]
+        open_rows.append(row)
+
+        self.depths.append(depth)
+        self.last_flags.append(1)
+        self._buffer += display.encode("utf-8")
+        self.offsets.append(len(self._buffer))
+        return row
+
+    def display(self, row: int) -> str:
+        """The display text of the node at `row`."""
+        return self._buffer[self.offsets[row] : self.offsets[row + 1]].decode("utf-8")
+
+    @classmethod
+    def from_node(cls, node: Renderable) -> FlatTree:
+        """Flatten a tree of TextRenderNodes (or any Renderable)."""
+        from ascii_tree import _children_of
+
+        tree = cls()
+        stack: t.List[t.Tuple[Renderable, int]] = [(node, 0)]
+        while stack:
+            current, depth = stack.pop()
+            tree.append(current.display, depth)
+            children = _children_of(current)
+            if children:
+                stack.extend((child, depth + 1) for child in reversed(children))
+        return tree
+
+    def to_node(self) -> TextRenderNode:
+        """Rebuild the tree as TextRenderNodes."""
+        from ascii_tree import TextRenderNode
+
+        if not self.depths:
+            raise ValueError("Can't build a node from an empty FlatTree.")
+        root = TextRenderNode(self.display(0))
+        path = [root]
+        for row in range(1, len(self.depths)):
+            depth = self.depths[row]
+            node = TextRenderNode(self.display(row))
+            del path[depth:]
+            path[-1].children.append(node)
+            path.append(node)
+        return root
+
+    def _iter_lines(
+        self,
+        glyphs: styles.CompiledStyle,
+        max_depth: t.Optional[int] = None,
+        max_children: t.Optional[int] = None,
+        prefix: str = "",
+        split: bool = False,
+    ) -> t.Iterator[t.Union[str, t.Tuple[int, int, str]]]:
+        """Render the rows in order; see `ascii_tree.iter_render`.
+
+        This is a single pass over the arrays with no per-node recursion.  The
+        prefix for a depth is built once, when the row that opens it is
+        reached, and shared by every row below it; only display text is
+        decoded per row.
+
+        Args:
+            prefix: Prepended to every line after the first, as if the tree
+                were a subtree drawn under that prefix.
+            split: Instead of skipping the descendants of rows at
+                `max_depth`, yield a (first row, end row, prefix) tuple for
+                them, so they can be rendered elsewhere with that prefix.
+        """
+        depths = self.depths
+        last_flags = self.last_flags
+        offsets = self.offsets
+        buffer = self._buffer
+        row_count = len(depths)
+        if not row_count:
+            return
+        tee, corner, vline, blank = glyphs
+        limit_depth = max_depth is not None
+        limit_children = max_children is not None
+        # the depths as raw bytes, for finding where subtrees end
+        raw_depths = depths.tobytes() if limit_depth or limit_children else b""
+
+        yield f"{self.display(0)}\n"
+
+        # Per open level (rows at depth level + 1): the length of the segment
+        # added to the prefix when descending into it, how many children of
+        # the current parent we've seen, and how many of those max_children
+        # hid.  One prefix is shared by every level, grown on descent and
+        # trimmed on ascent, so memory grows with the depth, not its square.
+        lengths = [0]
+        seen = [0]
+        hidden = [0]
+
+        def close_levels(keep: int) -> t.Iterator[str]:
+            nonlocal prefix
+            for level in range(len(seen) - 1, keep - 1, -1):
+                if hidden[level]:
+                    yield f"{prefix}{corner}... {hidden[level]} more\n"
+                if lengths[level]:
+                    prefix = prefix[: -lengths[level]]
+            del lengths[keep:], seen[keep:], hidden[keep:]
+
+        if limit_depth and max_depth < 1:
+            row = row_count
+        else:
+            row = 1
+        while row < row_count:
+            depth = depths[row]
+            if len(seen) > depth:
+                yield from close_levels(depth)
+            level = depth - 1
+            seen[level] += 1
+            if limit_children and seen[level] > max_children:
+                # skip this child and its whole subtree
+                hidden[level] += 1
+                row = self._subtree_end(row, raw_depths)
+                continue
+
+            is_last = last_flags[row]
+            display = buffer[offsets[row] : offsets[row + 1]].decode("utf-8")
+            yield f"{prefix}{corner if is_last else tee}{display}\n"
+
+            row += 1
+            if row < row_count and depths[row] > depth:
+                segment = blank if is_last else vline
+                if limit_depth and depth >= max_depth:
+                    end = self._subtree_end(row - 1, raw_depths)
+                    if split:
+                        yield row, end, prefix + segment
+                    row = end
+                else:
+                    prefix += segment
+                    lengths.append(len(segment))
+                    seen.append(0)
+                    hidden.append(0)
+
+        yield from close_levels(0)
+
+    def _iter_rows(
+        self,
+        max_depth: t.Optional[int] = None,
+        max_children: t.Optional[int] = None,
+    ) -> t.Iterator[t.Tuple[int, t.Union[str, int]]]:
+        """Walk the rows in the order `_iter_lines` draws them.
+
+        Yields (depth, display text) for each row shown, and after the rows
+        shown at a level where `max_children` hid some, (depth, number
+        hidden); see `ascii_tree._walk`.
+        """
+        depths = self.depths
+        offsets = self.offsets
+        buffer = self._buffer
+        row_count = len(depths)
+        if not row_count:
+            return
+        limit_depth = max_depth is not None
+        limit_children = max_children is not None
+        raw_depths = depths.tobytes() if limit_depth or limit_children else b""
+
+        yield 0, self.display(0)
+
+        # per open level (rows at depth level + 1): how many children of the
+        # current parent we've seen, and how many of those max_children hid
+        seen = [0]
+        hidden = [0]
+
+        def close_levels(keep: int) -> t.Iterator[t.Tuple[int, int]]:
+            for level in range(len(seen) - 1, keep - 1, -1):
+                if hidden[level]:
+                    yield level + 1, hidden[level]
+            del seen[keep:], hidden[keep:]
+
+        if limit_depth and max_depth < 1:
+            row = row_count
+        else:
+            row = 1
+        while row < row_count:
+            depth = depths[row]
+            if len(seen) > depth:
+                yield from close_levels(depth)
+            level = depth - 1
+            seen[level] += 1
+            if limit_children and seen[level] > max_children:
+                hidden[level] += 1
+                row = self._subtree_end(row, raw_depths)
+                continue
+
+            yield depth, buffer[offsets[row] : offsets[row + 1]].decode("utf-8")
+
+            row += 1
+            if row < row_count and depths[row] > depth:
+                if limit_depth and depth >= max_depth:
+                    row = self._subtree_end(row - 1, raw_depths)
+                else:
+                    seen.append(0)
+                    hidden.append(0)
+
+        yield from close_levels(0)
+
+    def _render_parallel(
+        self,
+        glyphs: styles.CompiledStyle,
+        max_depth: t.Optional[int],
+        max_children: t.Optional[int],
+        workers: int,
+        split_depth: int,
+    ) -> str:
+        """Render with a process pool; see `ascii_tree.render`.
+
+        The rows down to `split_depth` are rendered here.  The subtrees below
+        them only depend on the prefix they're drawn under, so they're sent,
+        as slices of the arrays, to the pool in batches of roughly equal row
+        counts, and the results are stitched back in order.
+        """
+        if max_depth is not None and max_depth <= split_depth:
+            return "".join(self._iter_lines(glyphs, max_depth, max_children))
+
+        pieces = list(self._iter_lines(glyphs, split_depth, max_children, split=True))
+        subtrees = [piece for piece in pieces if type(piece) is tuple]
+        if not subtrees:
+            return "".join(pieces)
+
+        # group neighboring subtrees, a few batches per worker
+        target_rows = sum(end - start for start, end, _ in subtrees)
+        target_rows //= workers * 4
+        batches: t.List[t.List[t.Tuple[int, int, str]]] = []
+        batch_rows = 0
+        for subtree in subtrees:
+            if not batches or batch_rows >= target_rows:
+                batches.append([])
+                batch_rows = 0
+            batches[-1].append(subtree)
+            batch_rows += subtree[1] - subtree[0]
+
+        subtree_max_depth = None if max_depth is None else max_depth - split_depth
+        offsets = self.offsets
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for batch in batches:
+                # each slice starts at the row above the subtree, its root
+                first = batch[0][0] - 1
+                last = batch[-1][1]
+                futures.append(
+                    executor.submit(
+                        _render_slices,
+                        self.depths[first:last],
+                        self.last_flags[first:last],
+                        offsets[first : last + 1],
+                        self._buffer[offsets[first] : offsets[last]],
+                        [
+                            (start - 1 - first, end - first, prefix)
+                            for start, end, prefix in batch
+                        ],
+                        glyphs,
+                        subtree_max_depth,
+                        max_children,
+                    )
+                )
+            rendered = iter([text for future in futures for text in future.result()])
+            return "".join(
+                next(rendered) if type(piece) is tuple else piece for piece in pieces
+            )
+
+    def _subtree_end(self, row: int, raw_depths: bytes) -> int:
+        """The index of the first row after `row`'s descendants.
+
+        That's the first later row no deeper than `row`.  If `row` has a
+        sibling after it, that's the sibling: the first later row at the
+        same depth, found with a single search of the raw depths that stops
+        there.  Otherwise the descendants are stepped through until a
+        shallower row.  Either way the cost follows the size of the subtree.
+        """
+        depths = self.depths
+        end = len(depths)
+        depth = depths[row]
+        start = row + 1
+        if start >= end or depths[start] <= depth:
+            return start
+        if self.last_flags[row]:
+            if depth == 1:
+                # a last child of the root ends the tree
+                return end
+            while start < end and depths[start] > depth:
+                start += 1
+            return start
+        itemsize = depths.itemsize
+        pattern = depth.to_bytes(itemsize, sys.byteorder)
+        index = raw_depths.find(pattern, start * itemsize)
+        # a match straddling two items doesn't count
+        while index % itemsize:
+            index = raw_depths.find(pattern, index + 1)
+        return end if index < 0 else index // itemsize
+
+
+def _render_slices(
+    depths: array,
+    last_flags: bytearray,
+    offsets: array,
+    buffer: bytearray,
+    subtrees: t.List[t.Tuple[int, int, str]],
+    glyphs: styles.CompiledStyle,
+    max_depth: t.Optional[int],
+    max_children: t.Optional[int],
+) -> t.List[str]:
+    """Render subtrees from slices of a FlatTree's arrays, in a worker process.
+
+    Each subtree is given as (root row, end row, prefix), relative to the
+    slices.  Returns the lines below each subtree's root, drawn under its
+    prefix.
+    """
+    base_offset = offsets[0]
+    offsets = array("Q", [offset - base_offset for offset in offsets])
+    results = []
+    for root, end, prefix in subtrees:
+        tree = FlatTree()
+        base_depth = depths[root]
+        tree.depths = array("I", [depth - base_depth for depth in depths[root:end]])
+        tree.last_flags = last_flags[root:end]
+        tree.offsets = offsets[root : end + 1]
+        tree._buffer = buffer
+        lines = tree._iter_lines(glyphs, max_depth, max_children, prefix)
+        next(lines)  # the root's own line was drawn by the caller
+        results.append("".join(lines))
+    return results
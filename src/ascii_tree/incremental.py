@@ -0,0 +1,260 @@
+"""Incremental rendering for trees that are redrawn repeatedly."""
+from __future__ import annotations
+
+import typing as t
+
+from ascii_tree import styles
+
+if t.TYPE_CHECKING:
+    from ascii_tree import Renderable
+
+
+__all__ = ["RenderCache"]
+
+
+class RenderCache:
+    """Renders a tree repeatedly, redoing only the parts that changed.
+
+    The cache keeps the last output as a list of lines, and for every node,
+    the number of lines in its subtree, the prefix drawn in front of its
+    display text and the prefix its children are drawn under.  Those are all
+    it takes to find where a node's lines are in the list, and whether they
+    still fit where the node is now.
+
+    After changing a node's display, or adding, removing or reordering a
+    node's children, call `invalidate` with that node.  The next `render`
+    only walks the invalidated nodes and their ancestors.  Their own lines
+    are drawn again, and the lines of every other subtree are carried over
+    as a slice of the list, reusing the same strings.  Only when a subtree's
+    prefix changes (its parent gained or lost a later child, or it moved) are
+    its lines drawn again with the new prefix, keeping their display text.
+    So the Python-level work per frame follows the number of changed nodes
+    and lines rather than the size of the tree; what's left is joining the
+    lines into the output.
+
+    Args:
+        style: The style to use when rendering the tree.
+        width: The width of the horizontal lines in the tree. Defaults to 1.
+        spacing: The number of spaces to use between the horizontal line
+            and the node's display text. Defaults to 1.
+    """
+
+    def __init__(
+        self,
+        style: styles.TextRenderStyle = styles.solid_line_style,
+        width: int = 1,
+        spacing: int = 1,
+    ):
+        self.glyphs = styles.compile_style(
+            style if style else styles.solid_line_style, width, spacing
+        )
+        # id(node) -> what was drawn for the node
+        self._entries: t.Dict[int, _Entry] = {}
+        # id(node) -> the parent it was last drawn under
+        self._parents: t.Dict[int, Renderable] = {}
+        self._dirty: t.Set[int] = set()
+        # the lines of the last tree drawn, and the id of its root
+        self._lines: t.List[str] = []
+        self._root: t.Optional[int] = None
+
+    def render(self, node: Renderable) -> str:
+        """Render the tree rooted at `node`, reusing unchanged subtrees."""
+        from ascii_tree import _children_of
+
+        tee, corner, vline, blank = self.glyphs
+        entries = self._entries
+        dirty = self._dirty
+        old_lines = self._lines
+        old_start = self._old_starts()
+        lines: t.List[str] = []
+
+        # The old layout is read until the whole tree is drawn, so the entries
+        # of redrawn nodes, and the parents of their children, are only
+        # stored at the end: (id, new entry, previous entry) and (id, parent).
+        drawn: t.List[t.Tuple[int, _Entry, t.Optional[_Entry]]] = []
+        new_parents: t.List[t.Tuple[int, Renderable]] = []
+
+        # pre-order walk with an explicit stack of (node, prefix, child
+        # prefix), where an _END item closes a redrawn node's subtree
+        stack: t.List[t.Tuple[t.Any, t.Any, t.Any]] = [(node, "", "")]
+        while stack:
+            current, prefix, child_prefix = stack.pop()
+            if current is _END:
+                prefix.size = len(lines) - child_prefix
+                continue
+            key = id(current)
+            entry = entries.get(key)
+            if entry is not None and key not in dirty:
+                start = old_start(key)
+                if start is not None:
+                    if entry.prefix == prefix and entry.child_prefix == child_prefix:
+                        lines += old_lines[start : start + entry.size]
+                    else:
+                        self._reindent(entry, start, prefix, child_prefix, lines)
+                    continue
+
+            children = _children_of(current)
+            new_entry = _Entry(
+                current, tuple(id(child) for child in children), prefix, child_prefix
+            )
+            drawn.append((key, new_entry, entry))
+            stack.append((_END, new_entry, len(lines)))
+            lines.append(f"{prefix}{current.display}\n")
+            last_index = len(children) - 1
+            for index in range(last_index, -1, -1):
+                child = children[index]
+                new_parents.append((id(child), current))
+                if index == last_index:
+                    stack.append((child, child_prefix + corner, child_prefix + blank))
+                else:
+                    stack.append((child, child_prefix + tee, child_prefix + vline))
+
+        # children dropped by redrawn nodes, as (parent, child ids); they're
+        # only forgotten once every node has been drawn, in case they moved
+        removed: t.List[t.Tuple[Renderable, t.Set[int]]] = []
+        for key, new_entry, previous in drawn:
+            entries[key] = new_entry
+            dirty.discard(key)
+            if previous is not None and previous.child_ids != new_entry.child_ids:
+                removed.append(
+                    (
+                        new_entry.node,
+                        set(previous.child_ids).difference(new_entry.child_ids),
+                    )
+                )
+        parents = self._parents
+        parents.update(new_parents)
+        parents.pop(id(node), None)
+        for parent, child_ids in removed:
+            self._forget_removed(parent, child_ids)
+
+        self._lines = lines
+        self._root = id(node)
+        return "".join(lines)
+
+    def invalidate(self, *nodes: Renderable) -> None:
+        """Mark nodes (and so their ancestors) as needing to be redrawn."""
+        dirty = self._dirty
+        parents = self._parents
+        for node in nodes:
+            key = id(node)
+            while key not in dirty:
+                dirty.add(key)
+                parent = parents.get(key)
+                if parent is None:
+                    break
+                key = id(parent)
+
+    def clear(self) -> None:
+        """Forget every cached line."""
+        self._entries.clear()
+        self._parents.clear()
+        self._dirty.clear()
+        self._lines = []
+        self._root = None
+
+    def _old_starts(self) -> t.Callable[[int], t.Optional[int]]:
+        """A lookup for where a node's lines start in the last output.
+
+        A node's lines follow its parent's line and the lines of its earlier
+        siblings, so the starts of a parent's children are worked out
+        together, from the subtree sizes, and remembered.  Returns None for
+        nodes that weren't in the last tree drawn.
+        """
+        entries = self._entries
+        parents = self._parents
+        starts: t.Dict[int, int] = {} if self._root is None else {self._root: 0}
+
+        def old_start(key: int) -> t.Optional[int]:
+            # climb to the nearest ancestor whose start is known
+            path = []
+            while key not in starts:
+                parent = parents.get(key)
+                if parent is None:
+                    return None
+                path.append(key)
+                key = id(parent)
+            for child_key in reversed(path):
+                start = starts[key] + 1
+                for sibling in entries[key].child_ids:
+                    starts[sibling] = start
+                    start += entries[sibling].size
+                if child_key not in starts:
+                    return None
+                key = child_key
+            return starts[key]
+
+        return old_start
+
+    def _reindent(
+        self,
+        entry: _Entry,
+        start: int,
+        prefix: str,
+        child_prefix: str,
+        lines: t.List[str],
+    ) -> None:
+        """Add a subtree's last lines to `lines`, under new prefixes.
+
+        Each line keeps its display text, and the subtree's entries record
+        their new prefixes.
+        """
+        tee, corner, vline, blank = self.glyphs
+        entries = self._entries
+        old_lines = self._lines
+        index = start
+        stack = [(entry, prefix, child_prefix)]
+        while stack:
+            current, prefix, child_prefix = stack.pop()
+            lines.append(prefix + old_lines[index][len(current.prefix) :])
+            index += 1
+            current.prefix = prefix
+            current.child_prefix = child_prefix
+            child_ids = current.child_ids
+            last_index = len(child_ids) - 1
+            for child_index in range(last_index, -1, -1):
+                child = entries[child_ids[child_index]]
+                if child_index == last_index:
+                    stack.append((child, child_prefix + corner, child_prefix + blank))
+                else:
+                    stack.append((child, child_prefix + tee, child_prefix + vline))
+
+    def _forget_removed(self, parent: Renderable, removed: t.Set[int]) -> None:
+        """Drop cached subtrees that are no longer drawn under `parent`."""
+        entries = self._entries
+        parents = self._parents
+        stack = [(key, parent) for key in removed]
+        while stack:
+            key, expected_parent = stack.pop()
+            # a node that moved has already been drawn under its new parent
+            if parents.get(key) is not expected_parent:
+                continue
+            del parents[key]
+            self._dirty.discard(key)
+            entry = entries.pop(key, None)
+            if entry is not None:
+                stack.extend((child_id, entry.node) for child_id in entry.child_ids)
+
+
+class _Entry:
+    """What was drawn for one node: see `RenderCache`."""
+
+    __slots__ = ("node", "child_ids", "size", "prefix", "child_prefix")
+
+    def __init__(
+        self,
+        node: Renderable,
+        child_ids: t.Tuple[int, ...],
+        prefix: str,
+        child_prefix: str,
+    ):
+        self.node = node
+        self.child_ids = child_ids
+        # the number of lines in the node's subtree, set once it's drawn
+        self.size = 0
+        self.prefix = prefix
+        self.child_prefix = child_prefix
+
+
+# Closes a redrawn node's subtree on the render stack.
+_END: t.Any = object()
@@ -0,0 +1,223 @@
+"""Reading rendered trees back into nodes."""
+from __future__ import annotations
+
+import io
+import typing as t
+
+from ascii_tree import styles
+from ascii_tree.flat import FlatTree
+
+if t.TYPE_CHECKING:
+    from ascii_tree import TextRenderNode
+
+
+__all__ = ["detect_style", "parse"]
+
+
+# Per open node: the prefixes its children's lines may start with (two when
+# the style draws every child with the same head, so we can't tell yet
+# whether the node is the last of its siblings), and the heads built from
+# them, filled in when first needed.
+_Level = t.List[t.Any]
+
+
+def parse(
+    source: t.Union[str, t.IO[str]],
+    style: t.Optional[styles.TextRenderStyle] = None,
+    width: t.Optional[int] = None,
+    spacing: t.Optional[int] = None,
+    flat: bool = False,
+) -> t.Union[TextRenderNode, FlatTree]:
+    """Rebuild a tree from its rendered text.
+
+    The text is read in a single pass, one line at a time, so a file object
+    is never read into memory as a whole.  Each line is matched against the
+    prefixes its parent's children are drawn under, so only the heads of the
+    currently open nodes are kept, and each line costs a few `startswith`
+    calls however deep it is.
+
+    The first line is the root.  The tree ends at the first blank line after
+    it (or the end of the text), so a summary printed after a tree, like the
+    one from the CLI's `--summary`, is ignored.  Lines like "... 3 more" from
+    a truncated render are read as nodes with that display text.
+
+    Args:
+        source: The rendered tree, as a string or a text file object.
+        style: The style the tree was drawn in.  Defaults to detecting it,
+            from the styles in `styles.styles_dict`.
+        width: The width of the horizontal lines.  Defaults to detecting it.
+        spacing: The number of spaces between the horizontal lines and the
+            display text.  Defaults to detecting it; if display text can
+            start with a space, pass it explicitly.
+        flat: Return a FlatTree rather than TextRenderNodes, for trees too
+            large to hold one object per node.  Defaults to False.
+
+    Returns:
+        The root node of the tree, or a FlatTree.
+
+    Raises:
+        ValueError: If the text is empty, the style can't be detected, or a
+            line doesn't fit in the tree.
+    """
+    rows = _parse_rows(_iter_lines(source), style, width, spacing)
+    if flat:
+        tree = FlatTree()
+        for depth, display in rows:
+            tree.append(display, depth)
+        if not len(tree):
+            raise ValueError("Can't parse an empty tree.")
+        return tree
+
+    from ascii_tree import TextRenderNode
+
+    path: t.List[TextRenderNode] = []
+    for depth, display in rows:
+        node = TextRenderNode(display)
+        if depth:
+            del path[depth:]
+            path[-1].children.append(node)
+        path.append(node)
+    if not path:
+        raise ValueError("Can't parse an empty tree.")
+    return path[0]
+
+
+def detect_style(
+    source: t.Union[str, t.IO[str]],
+    style: t.Optional[styles.TextRenderStyle] = None,
+) -> t.Optional[t.Tuple[styles.TextRenderStyle, int, int]]:
+    """Find the style, width and spacing a tree was rendered with.
+
+    Only the lines up to the root's first child are read.
+
+    Args:
+        source: The rendered tree, as a string or a text file object.
+        style: Only detect the width and spacing, for this style.
+
+    Returns:
+        A (style, width, spacing) tuple, or None if the tree is just a root.
+
+    Raises:
+        ValueError: If the first child's line doesn't match any style.
+    """
+    lines = _iter_lines(source)
+    next(lines, None)
+    for line in lines:
+        line = line[:-1] if line.endswith("\n") else line
+        if not line:
+            break
+        return _detect(line, style)
+    return None
+
+
+def _iter_lines(source: t.Union[str, t.IO[str]]) -> t.Iterator[str]:
+    """The lines of a string or text file, split only on newlines."""
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    return iter(source)
+
+
+def _detect(
+    line: str, style: t.Optional[styles.TextRenderStyle]
+) -> t.Tuple[styles.TextRenderStyle, int, int]:
+    """Detect the style, width and spacing from the first child's line."""
+    candidates = [style] if style else list(styles.styles_dict.values())
+    for candidate in candidates:
+        for head in dict.fromkeys((candidate.tee, candidate.corner)):
+            if not line.startswith(head):
+                continue
+            position = len(head)
+            hline = candidate.hline
+            width = 0
+            while hline and line.startswith(hline, position):
+                position += len(hline)
+                width += 1
+            # without a tee or corner, the horizontal line is all there is
+            if not head and not width:
+                continue
+            spacing = len(line) - position - len(line[position:].lstrip(" "))
+            return candidate, width, spacing
+    raise ValueError(f"Can't detect the style of the tree from {line!r}.")
+
+
+def _parse_rows(
+    lines: t.Iterator[str],
+    style: t.Optional[styles.TextRenderStyle],
+    width: t.Optional[int],
+    spacing: t.Optional[int],
+) -> t.Iterator[t.Tuple[int, str]]:
+    """Parse lines into (depth, display text) rows, in depth-first order."""
+    for root in lines:
+        yield 0, root[:-1] if root.endswith("\n") else root
+        break
+    else:
+        return
+
+    glyphs = None
+    if style is not None and width is not None and spacing is not None:
+        glyphs = styles.compile_style(style, width, spacing)
+    # the open nodes, from the root down to the last node read
+    stack: t.List[_Level] = [[("",), None]]
+
+    for number, line in enumerate(lines, 2):
+        if line.endswith("\n"):
+            line = line[:-1]
+        if not line:
+            return
+        if glyphs is None:
+            detected, detected_width, detected_spacing = _detect(line, style)
+            glyphs = styles.compile_style(
+                detected,
+                detected_width if width is None else width,
+                detected_spacing if spacing is None else spacing,
+            )
+
+        # the line is a child of the deepest open node whose heads it starts
+        # with; the nodes below that one have no more children to come
+        while stack:
+            level = stack[-1]
+            heads = level[1]
+            if heads is None:
+                # most nodes are leaves, so check the prefixes before
+                # building any heads
+                if not line.startswith(level[0]):
+                    stack.pop()
+                    continue
+                heads = level[1] = _heads(level[0], glyphs)
+            for head, prefix, child_prefixes in heads:
+                if line.startswith(head):
+                    break
+            else:
+                stack.pop()
+                continue
+            break
+        else:
+            raise ValueError(f"Line {number} doesn't fit in the tree: {line!r}")
+
+        if len(level[0]) > 1:
+            # now we know which of the prefixes this node's children use
+            level[0] = (prefix,)
+            level[1] = _heads(level[0], glyphs)
+        yield len(stack), line[len(head) :]
+        stack.append([child_prefixes, None])
+
+
+def _heads(
+    prefixes: t.Tuple[str, ...], glyphs: styles.CompiledStyle
+) -> t.List[t.Tuple[str, str, t.Tuple[str, ...]]]:
+    """The heads of a node's children's lines, given its possible prefixes.
+
+    Each is (head, the prefix it was built from, the possible prefixes of
+    the children of a node drawn with that head).
+    """
+    tee, corner, vline, blank = glyphs
+    heads = []
+    for prefix in prefixes:
+        if tee == corner:
+            # the head doesn't say whether the node is the last child
+            child_prefixes = tuple(dict.fromkeys((prefix + vline, prefix + blank)))
+            heads.append((prefix + tee, prefix, child_prefixes))
+        else:
+            heads.append((prefix + tee, prefix, (prefix + vline,)))
+            heads.append((prefix + corner, prefix, (prefix + blank,)))
+    return heads
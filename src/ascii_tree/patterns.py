@@ -0,0 +1,343 @@
+"""Include and exclude patterns for renderable_dir_tree, with .gitignore rules."""
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import typing as t
+
+
+__all__ = ["PatternFilter", "translate"]
+
+
+_FullMatch = t.Callable[[str], t.Optional[t.Match[str]]]
+
+# The characters that make a pattern more than a literal name.
+_GLOB_CHARS = frozenset("*?[\\")
+
+
+class PatternFilter:
+    """Decides which entries of a directory tree are left out, by pattern.
+
+    Patterns follow `.gitignore` syntax: `*` and `?` don't match a slash,
+    `**` matches any number of directories, a pattern with a slash in it
+    (other than a trailing one) is matched against the whole path from its
+    directory rather than any name below it, a trailing slash only matches
+    directories, and a leading `!` brings back something an earlier pattern
+    left out.  When several patterns match, the last one wins.
+
+    Each directory's patterns (the `exclude` patterns for the root, and each
+    `.gitignore` file's for its own directory) are compiled together once:
+    plain names go in a set, `*.ext`-style patterns in one `str.endswith`
+    call, and everything else in a single regular expression (one for each
+    run of patterns between negations), so checking an entry takes a few
+    calls however many patterns there are.  Excluded directories are never
+    listed, so nothing below them is read.
+
+    Args:
+        root: The root directory of the tree.  Patterns are matched against
+            paths relative to it.
+        include: If given, only files matching one of these patterns are
+            kept.  A pattern with a trailing slash keeps every file below a
+            matching directory.  Directories are kept regardless.
+        exclude: Patterns for files and directories to leave out.  These
+            take precedence over `.gitignore` files.
+        gitignore: Whether to also follow the `.gitignore` files found in
+            the tree (and leave out `.git` directories).  Files above the
+            root, and git's global excludes, aren't read.
+    """
+
+    def __init__(
+        self,
+        root: t.Union[str, os.PathLike],
+        include: t.Sequence[str] = (),
+        exclude: t.Sequence[str] = (),
+        gitignore: bool = False,
+    ):
+        self.root = os.fspath(root)
+        self.gitignore = gitignore
+        self._root_prefix = os.path.join(self.root, "")
+        if gitignore:
+            exclude = [".git/", *exclude]
+        rules = _compile(exclude, 0)
+        self._exclude: t.Tuple[_RuleSet, ...] = (rules,) if rules else ()
+        self._include = _compile_include(include)
+        # directory -> the rules of its own and every enclosing .gitignore,
+        # innermost first, for directories that have a .gitignore
+        self._gitignores: t.Dict[str, t.Tuple[_RuleSet, ...]] = {}
+
+    def for_dir(self, dir_path: str) -> t.Optional[t.Callable[[str, bool], bool]]:
+        """The test for entries of a directory that's about to be expanded.
+
+        Reads the directory's `.gitignore`, if there is one.  Returns a
+        callable that takes an entry's name and whether it's a directory,
+        and returns True if the entry is excluded, or None if nothing in the
+        directory can be.
+        """
+        rel_dir = self._relative(dir_path)
+        rule_sets = self._exclude
+        if self.gitignore:
+            rule_sets += self._gitignore_rules(dir_path, len(rel_dir))
+        include = self._include
+        if not rule_sets and include is None:
+            return None
+        file_rules = [rules.files for rules in rule_sets if rules.files]
+        dir_rules = [rules.dirs for rules in rule_sets if rules.dirs]
+
+        def is_excluded(name: str, is_dir: bool) -> bool:
+            path = rel_dir + name
+            for rules in dir_rules if is_dir else file_rules:
+                matched = rules.match(path[rules.offset :], name)
+                if matched:
+                    return True
+                if matched is not None:
+                    # re-included, but a file still has to match `include`
+                    break
+            if include is not None and not is_dir:
+                return include.match(path, name) is not True
+            return False
+
+        return is_excluded
+
+    def _relative(self, dir_path: str) -> str:
+        """A directory's path relative to the root, with a trailing slash."""
+        if dir_path == self.root:
+            return ""
+        if not dir_path.startswith(self._root_prefix):
+            raise ValueError(f"{dir_path!r} is not inside {self.root!r}.")
+        rel_dir = dir_path[len(self._root_prefix) :]
+        if os.sep != "/":
+            rel_dir = rel_dir.replace(os.sep, "/")
+        return rel_dir + "/"
+
+    def _gitignore_rules(self, dir_path: str, offset: int) -> t.Tuple[_RuleSet, ...]:
+        """Read a directory's .gitignore, and return every rule that applies."""
+        gitignores = self._gitignores
+        parent_rules: t.Tuple[_RuleSet, ...] = ()
+        if dir_path != self.root:
+            # the nearest enclosing directory with a .gitignore
+            path = os.path.dirname(dir_path)
+            while True:
+                found = gitignores.get(path)
+                if found is not None:
+                    parent_rules = found
+                    break
+                parent = os.path.dirname(path)
+                if path == self.root or parent == path:
+                    break
+                path = parent
+
+        path = os.path.join(dir_path, ".gitignore")
+        try:
+            with open(path, encoding="utf-8", errors="surrogateescape") as fp:
+                own_rules = _compile(fp.read().splitlines(), offset)
+        except OSError:
+            own_rules = None
+        if own_rules is None:
+            # it may have been removed since the directory was last expanded
+            gitignores.pop(dir_path, None)
+            return parent_rules
+        rules = (own_rules, *parent_rules)
+        gitignores[dir_path] = rules
+        return rules
+
+
+class _Rules:
+    """One source's patterns, compiled for matching either files or dirs.
+
+    Consecutive patterns that all exclude (or all re-include) give the same
+    answer whichever of them matches, so each such run is compiled as one:
+    a set of plain names, a tuple of suffixes for `*.ext`-style patterns,
+    and one regex for other names and one for paths.  The runs are checked
+    from the last one back, and the first to match decides.
+    """
+
+    __slots__ = ("offset", "runs")
+
+    def __init__(self, patterns: t.List[t.Tuple[str, bool]], offset: int):
+        self.offset = offset
+        self.runs = [
+            _Run([pattern for pattern, _ in run], negated)
+            for negated, run in itertools.groupby(
+                reversed(patterns), key=lambda item: item[1]
+            )
+        ]
+
+    def match(self, path: str, name: str) -> t.Optional[bool]:
+        """Whether the patterns exclude (True) or re-include (False) an entry.
+
+        `path` is relative to the patterns' directory.  Returns None if no
+        pattern matches.
+        """
+        for run in self.runs:
+            if (
+                name in run.names
+                or (run.suffixes and name.endswith(run.suffixes))
+                or (run.any_name is not None and run.any_name(name))
+                or (run.any_path is not None and run.any_path(path))
+            ):
+                return run.excludes
+        return None
+
+
+class _Run:
+    """Consecutive patterns that are all negated, or all not."""
+
+    __slots__ = ("names", "suffixes", "any_name", "any_path", "excludes")
+
+    def __init__(self, patterns: t.List[str], negated: bool):
+        names = set()
+        suffixes = []
+        name_sources = []
+        path_sources = []
+        for pattern in patterns:
+            if "/" in pattern:
+                path_sources.append(translate(pattern))
+            elif not _GLOB_CHARS.intersection(pattern):
+                names.add(pattern)
+            elif pattern.startswith("*") and not _GLOB_CHARS.intersection(pattern[1:]):
+                suffixes.append(pattern[1:])
+            else:
+                # without a slash, a pattern can only match the last name
+                name_sources.append(_translate_part(pattern))
+        self.names = frozenset(names)
+        self.suffixes = tuple(suffixes)
+        self.any_name = _any(name_sources)
+        self.any_path = _any(path_sources)
+        self.excludes = not negated
+
+
+class _RuleSet:
+    """The compiled patterns from one source, for files and for dirs."""
+
+    __slots__ = ("files", "dirs")
+
+    def __init__(self, files: t.Optional[_Rules], dirs: t.Optional[_Rules]):
+        self.files = files
+        self.dirs = dirs
+
+
+def _compile(lines: t.Iterable[str], offset: int) -> t.Optional[_RuleSet]:
+    """Compile the patterns from one source, or None if there aren't any."""
+    file_patterns: t.List[t.Tuple[str, bool]] = []
+    dir_patterns: t.List[t.Tuple[str, bool]] = []
+    for line in lines:
+        parsed = _parse(line)
+        if parsed is None:
+            continue
+        pattern, negated, dir_only = parsed
+        if not dir_only:
+            file_patterns.append((pattern, negated))
+        dir_patterns.append((pattern, negated))
+    if not dir_patterns:
+        return None
+    return _RuleSet(
+        _Rules(file_patterns, offset) if file_patterns else None,
+        _Rules(dir_patterns, offset),
+    )
+
+
+def _compile_include(lines: t.Iterable[str]) -> t.Optional[_Rules]:
+    """Compile include patterns, which only ever match files.
+
+    A directory-only pattern is rewritten to match the files below the
+    directories it matches, so `src/` keeps `lib/src/main.py`.
+    """
+    patterns: t.List[t.Tuple[str, bool]] = []
+    for line in lines:
+        parsed = _parse(line)
+        if parsed is None:
+            continue
+        pattern, negated, dir_only = parsed
+        if dir_only:
+            pattern = f"{pattern}/**" if "/" in pattern else f"**/{pattern}/**"
+        patterns.append((pattern, negated))
+    return _Rules(patterns, 0) if patterns else None
+
+
+def _any(sources: t.List[str]) -> t.Optional[_FullMatch]:
+    """One regex that matches whatever any of the sources match."""
+    if not sources:
+        return None
+    return re.compile("|".join(f"(?:{source})" for source in sources)).fullmatch
+
+
+def _parse(line: str) -> t.Optional[t.Tuple[str, bool, bool]]:
+    """Parse one .gitignore line into (pattern, negated, dir_only)."""
+    # trailing spaces are ignored unless escaped
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    return line, negated, dir_only
+
+
+def translate(pattern: str) -> str:
+    """Translate one `.gitignore`-style pattern into a regular expression.
+
+    The pattern shouldn't have a leading `!` or a trailing slash.  The
+    expression matches paths relative to the pattern's directory, with
+    forward slashes.
+    """
+    anchored = "/" in pattern
+    parts = pattern.lstrip("/").split("/")
+    last_index = len(parts) - 1
+    pieces = [] if anchored else ["(?:.*/)?"]
+    for index, part in enumerate(parts):
+        if part == "**":
+            if index == last_index:
+                pieces.append(".*")
+            else:
+                pieces.append("(?:.*/)?")
+            continue
+        pieces.append(_translate_part(part))
+        if index < last_index:
+            pieces.append("/")
+    return "".join(pieces)
+
+
+def _translate_part(part: str) -> str:
+    """Translate the glob syntax within one path component."""
+    pieces = []
+    index = 0
+    length = len(part)
+    while index < length:
+        char = part[index]
+        index += 1
+        if char == "*":
+            pieces.append("[^/]*")
+        elif char == "?":
+            pieces.append("[^/]")
+        elif char == "\\" and index < length:
+            pieces.append(re.escape(part[index]))
+            index += 1
+        elif char == "[":
+            end = index
+            if end < length and part[end] in "!^":
+                end += 1
+            if end < length and part[end] == "]":
+                end += 1
+            end = part.find("]", end)
+            if end == -1:
+                pieces.append(re.escape(char))
+                continue
+            body = part[index:end]
+            index = end + 1
+            if body[:1] in ("!", "^"):
+                # a negated class still never matches a slash
+                body = "^/" + body[1:]
+            pieces.append("[" + body.replace("\\", "\\\\") + "]")
+        else:
+            pieces.append(re.escape(char))
+    return "".join(pieces)
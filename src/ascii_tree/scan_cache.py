@@ -0,0 +1,202 @@
+"""A persistent cache of directory listings for renderable_dir_tree."""
+from __future__ import annotations
+
+import marshal
+import os
+import time
+import typing as t
+from pathlib import Path
+
+if t.TYPE_CHECKING:
+    from ascii_tree import _DirListing
+
+
+__all__ = ["ScanCache"]
+
+
+# Directories modified this recently (in ns) are never trusted by mtime alone:
+# a change made within the file system's timestamp resolution of a listing
+# would leave the directory's mtime unchanged.  FAT's is 2 seconds.
+_MTIME_RESOLUTION_NS = 2_000_000_000
+
+_MAGIC = b"ascii-tree scan cache\n"
+_FORMAT_VERSION = 2
+
+# entry flags, one byte per directory entry
+_DIR = 0
+_FILE = 1
+
+# path -> (st_dev, st_ino, st_mtime_ns, st_ctime_ns, entry names joined by "\0",
+# flags)
+_Entries = t.Dict[str, t.Tuple[int, int, int, int, str, bytes]]
+
+
+class ScanCache:
+    """Directory listings saved between runs, revalidated by a single stat.
+
+    Each directory's listing is stored along with its `(st_dev, st_ino,
+    st_mtime_ns, st_ctime_ns)`.  When the directory is scanned again, one
+    `os.stat` call tells whether anything was added, removed or renamed in it
+    since, or its permissions changed (which only shows in the ctime); if
+    not, the stored listing is used instead of reading the directory.  Listings
+    are stored before any filtering, so one cache serves every combination
+    of `renderable_dir_tree` options.  File sizes aren't stored, since a
+    file can change size without its directory's mtime changing.
+
+    The file is a short header followed by the entries in `marshal` format.
+    A file written by another version of this format, or that can't be
+    read, is ignored and replaced on the next `save`.
+
+    Listings that hit a permission error, and directories modified in the
+    last couple of seconds, are never cached.
+
+    Args:
+        path: The cache file.  It's loaded now if it exists, and written by
+            `save`.  Defaults to None (an in-memory cache).
+    """
+
+    def __init__(self, path: t.Union[str, Path, None] = None):
+        self.path = path
+        self._entries: _Entries = {}
+        # the names of the subdirectories of each directory listed since the
+        # cache was loaded, for telling which cached directories are gone
+        self._subdirs: t.Dict[str, t.Set[str]] = {}
+        if path is not None:
+            self._entries = _read(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def listing(self, path: str, scan: t.Callable[[str], _DirListing]) -> _DirListing:
+        """The listing of a directory, from the cache if it's still valid.
+
+        Args:
+            path: The directory to list.
+            scan: Lists the directory when the cached listing is missing or
+                stale, like `ascii_tree._scan_dir`.
+        """
+        started = time.time_ns()
+        stat = os.stat(path)
+        cached = self._entries.get(path)
+        if (
+            cached is not None
+            and cached[0] == stat.st_dev
+            and cached[1] == stat.st_ino
+            and cached[2] == stat.st_mtime_ns
+            and cached[3] == stat.st_ctime_ns
+        ):
+            names = cached[4].split("\0") if cached[4] else []
+            # the same paths os.scandir gives, without a join call per entry
+            prefix = os.path.join(path, "")
+            self._subdirs[path] = {
+                name for name, flag in zip(names, cached[5]) if flag == _DIR
+            }
+            return [
+                (name, prefix + name, flag == _FILE, None)
+                for name, flag in zip(names, cached[5])
+            ]
+
+        listing = scan(path)
+        if any(isinstance(is_file, PermissionError) for _, _, is_file, _ in listing):
+            # we can't tell which entries are directories
+            self._entries.pop(path, None)
+            return listing
+        self._subdirs[path] = {
+            name for name, _, is_file, _ in listing if is_file is False
+        }
+        if stat.st_mtime_ns >= started - _MTIME_RESOLUTION_NS:
+            self._entries.pop(path, None)
+        else:
+            self._entries[path] = (
+                stat.st_dev,
+                stat.st_ino,
+                stat.st_mtime_ns,
+                stat.st_ctime_ns,
+                "\0".join(name for name, _, _, _ in listing),
+                bytes(_FILE if is_file else _DIR for _, _, is_file, _ in listing),
+            )
+        return listing
+
+    def save(self, path: t.Union[str, Path, None] = None) -> None:
+        """Write the cache to a file, replacing it atomically.
+
+        Directories that are gone are dropped: those missing from their
+        parent's listing, when the parent was listed since the cache was
+        loaded, and everything below them.  Directories this run didn't
+        reach, because of `max_dir_depth` or a filter, are kept.
+
+        Args:
+            path: The file to write.  Defaults to the file the cache was
+                created with.
+        """
+        path = self.path if path is None else path
+        if path is None:
+            raise ValueError("No path was given to save the cache to.")
+        gone = _Gone(self._subdirs)
+        entries = {key: value for key, value in self._entries.items() if not gone(key)}
+        temp_path = f"{os.fspath(path)}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as fp:
+                fp.write(_header())
+                marshal.dump(entries, fp)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def _header() -> bytes:
+    # marshal's format can change between Python versions, so it's recorded
+    return _MAGIC + bytes([_FORMAT_VERSION, marshal.version])
+
+
+def _read(path: t.Union[str, Path]) -> _Entries:
+    """Load a cache file, or return no entries if it's missing or unusable."""
+    try:
+        with open(path, "rb") as fp:
+            data = fp.read()
+    except FileNotFoundError:
+        return {}
+    header = _header()
+    if not data.startswith(header):
+        return {}
+    try:
+        entries = marshal.loads(data[len(header) :])
+    except (EOFError, ValueError, TypeError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+class _Gone:
+    """Tells whether a directory is known to be gone, from fresh listings.
+
+    A directory is gone if its parent was listed and it isn't among the
+    parent's subdirectories, or if any of its ancestors is gone.  Answers
+    are remembered, so each ancestor is checked once however many cached
+    directories are below it.
+    """
+
+    def __init__(self, subdirs: t.Dict[str, t.Set[str]]):
+        self._subdirs = subdirs
+        self._known: t.Dict[str, bool] = {}
+
+    def __call__(self, path: str) -> bool:
+        known = self._known
+        # walk up to the nearest listed (or already answered) ancestor
+        chain = []
+        while path not in known:
+            parent, name = os.path.split(path)
+            if parent == path or not name:
+                known[path] = False
+                break
+            subdirs = self._subdirs.get(parent)
+            if subdirs is not None:
+                known[path] = name not in subdirs
+                break
+            chain.append(path)
+            path = parent
+        gone = known[path]
+        for path in chain:
+            known[path] = gone
+        return gone
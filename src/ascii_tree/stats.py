@@ -0,0 +1,147 @@
+"""Counters and timings for finding out where a slow tree spends its time."""
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+import typing as t
+
+
+__all__ = ["Stats"]
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+
+class Stats:
+    """Collects counters and timings from the functions that accept `stats`.
+
+    Pass the same Stats to several calls (say `renderable_dir_tree` and then
+    `render`) to see a whole command in one place.  Functions only measure
+    anything when given a Stats, so leaving it out costs nothing.
+
+    Phase times are wall-clock seconds:
+
+    - `build`: building a tree, in `renderable`, `renderable_from_parents` or
+      `renderable_dir_tree`.
+    - `listing`: reading directories (or the scan cache), part of `build`.
+      With `workers`, this adds up the time spent in every thread, so it can
+      be more than `build`.
+    - `callbacks`: running filters and interface callbacks, part of `build`.
+    - `render`: producing lines, not counting the time spent by whatever
+      consumes them.
+
+    Attributes:
+        nodes: Nodes built.
+        dirs_listed: Directories read (or looked up in the scan cache).
+        entries_listed: Entries found in those directories.
+        permission_errors: Directories or entries that couldn't be read.
+        callback_calls: Calls to filters and interface callbacks.
+        lines: Lines rendered.
+        bytes: UTF-8 bytes rendered.
+        phase_seconds: Seconds spent in each phase, keyed by name.
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.dirs_listed = 0
+        self.entries_listed = 0
+        self.permission_errors = 0
+        self.callback_calls = 0
+        self.lines = 0
+        self.bytes = 0
+        self.phase_seconds: t.Dict[str, float] = {}
+        # listings and callbacks may be recorded from worker threads
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        counters = ", ".join(
+            f"{name}={value!r}"
+            for name, value in vars(self).items()
+            if not name.startswith("_")
+        )
+        return f"{type(self).__name__}({counters})"
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        """Add seconds to a phase."""
+        with self._lock:
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> t.Iterator[None]:
+        """Time the body of a `with` block as part of a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, callback: F) -> F:
+        """Wrap a callback so its calls count towards the `callbacks` phase."""
+        perf_counter = time.perf_counter
+
+        def timed_callback(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                with self._lock:
+                    self.callback_calls += 1
+                    phase_seconds = self.phase_seconds
+                    phase_seconds["callbacks"] = (
+                        phase_seconds.get("callbacks", 0.0) + elapsed
+                    )
+
+        return t.cast(F, timed_callback)
+
+    def record_listing(
+        self, entry_count: int, seconds: float, permission_errors: int = 0
+    ) -> None:
+        """Count one directory listing."""
+        with self._lock:
+            self.dirs_listed += 1
+            self.entries_listed += entry_count
+            self.permission_errors += permission_errors
+            phase_seconds = self.phase_seconds
+            phase_seconds["listing"] = phase_seconds.get("listing", 0.0) + seconds
+
+    def count_lines(self, lines: t.Iterator[str]) -> t.Iterator[str]:
+        """Pass rendered lines through, counting them and the time to make them."""
+        perf_counter = time.perf_counter
+        elapsed = 0.0
+        line_count = 0
+        byte_count = 0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    line = next(lines)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += perf_counter() - start
+                line_count += 1
+                byte_count += len(line.encode("utf-8"))
+                yield line
+        finally:
+            self.lines += line_count
+            self.bytes += byte_count
+            self.add_time("render", elapsed)
+
+    def summary(self) -> str:
+        """A short, human-readable report."""
+        rows = [
+            ("nodes", f"{self.nodes:,}"),
+            ("dirs listed", f"{self.dirs_listed:,}"),
+            ("entries listed", f"{self.entries_listed:,}"),
+            ("permission errors", f"{self.permission_errors:,}"),
+            ("callback calls", f"{self.callback_calls:,}"),
+            ("lines", f"{self.lines:,}"),
+            ("bytes", f"{self.bytes:,}"),
+        ]
+        rows.extend(
+            (f"{phase} time", f"{seconds * 1000:,.1f} ms")
+            for phase, seconds in self.phase_seconds.items()
+        )
+        label_width = max(len(label) for label, _ in rows)
+        return "\n".join(f"{label:<{label_width}}  {value}" for label, value in rows)
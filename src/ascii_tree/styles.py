@@ -1,7 +1,16 @@
+import functools
+import typing as t
 from dataclasses import dataclass
 
 
-__all__ = ["TextRenderStyle", "solid_line_style", "clean_style", "basic_style"]
+__all__ = [
+    "TextRenderStyle",
+    "CompiledStyle",
+    "compile_style",
+    "solid_line_style",
+    "clean_style",
+    "basic_style",
+]
 
 @dataclass
 class TextRenderStyle:
@@ -14,6 +23,43 @@ class TextRenderStyle:
     space: str
 
 
+class CompiledStyle(t.NamedTuple):
+    """The ready-made segments used to draw one level of a tree.
+
+    `tee` and `corner` go in front of a node's display text, while `vline` and
+    `blank` are added to the prefix of that node's children, depending on
+    whether the node has siblings after it.
+    """
+
+    tee: str
+    corner: str
+    vline: str
+    blank: str
+
+
+def compile_style(
+    style: TextRenderStyle, width: int = 1, spacing: int = 1
+) -> CompiledStyle:
+    """Build (or fetch from cache) the segments for a style, width and spacing."""
+    return _compile_style(
+        style.hline, style.vline, style.tee, style.corner, width, spacing
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_style(
+    hline: str, vline: str, tee: str, corner: str, width: int, spacing: int
+) -> CompiledStyle:
+    hlines = hline * width
+    gap = " " * spacing
+    return CompiledStyle(
+        tee=tee + hlines + gap,
+        corner=corner + hlines + gap,
+        vline=vline + " " * (width + spacing),
+        blank=" " * (width + spacing + 1),
+    )
+
+
 # solid style - standard ASCII representation of trees
 """
 root
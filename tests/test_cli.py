@@ -0,0 +1,112 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from pathlib import Path
+
+from ascii_tree import render, renderable_dir_tree
+from ascii_tree.cli import main
+
+root_path = Path(__file__).parent / "fixtures" / "root_dir"
+src_path = Path(__file__).parent.parent / "src"
+
+
+def test_text_to_stdout(capsysbinary):
+    main([str(root_path)])
+    expected = render(renderable_dir_tree(root_path)) + "\n"
+    assert capsysbinary.readouterr().out == expected.encode("utf-8")
+
+
+def test_summary(capsysbinary):
+    main([str(root_path), "--summary"])
+    out = capsysbinary.readouterr().out.decode("utf-8")
+    assert out == render(renderable_dir_tree(root_path)) + "\n4 directories, 4 files\n"
+
+
+def test_summary_counts_hidden_files_and_marks_partial_totals(capsysbinary):
+    main([str(root_path), "--summary", "--max-files", "0", "--max-depth", "1"])
+    out = capsysbinary.readouterr().out.decode("utf-8")
+    assert out.endswith("\nat least 2 directories, 0 files\n")
+    main([str(root_path), "--summary", "--max-files", "0"])
+    out = capsysbinary.readouterr().out.decode("utf-8")
+    assert out.endswith("\n4 directories, 4 files\n")
+
+
+@pytest.mark.parametrize("encoding", [None, "utf-16"])
+def test_output(tmp_path, capsysbinary, encoding):
+    output = tmp_path / "tree.txt"
+    argv = [str(root_path), "--output", str(output)]
+    if encoding:
+        argv += ["--encoding", encoding]
+    main(argv)
+    expected = render(renderable_dir_tree(root_path))
+    assert output.read_bytes() == expected.encode(encoding or "utf-8")
+    assert capsysbinary.readouterr().out == b""
+
+
+def test_encoding_to_stdout(capsysbinary):
+    main([str(root_path), "--encoding", "utf-16"])
+    expected = render(renderable_dir_tree(root_path)) + "\n"
+    assert capsysbinary.readouterr().out == expected.encode("utf-16")
+
+
+def test_format_json(capsysbinary):
+    main([str(root_path), "--format", "json", "--du"])
+    document = json.loads(capsysbinary.readouterr().out)
+    assert document["display"] == "root_dir /"
+    assert document["file_count"] == 4
+    assert [child["display"] for child in document["children"]] == [
+        "child_dir_one /",
+        "child_dir_two /",
+    ]
+
+
+def test_format_ndjson(tmp_path):
+    output = tmp_path / "tree.ndjson"
+    main([str(root_path), "--format", "ndjson", "--output", str(output)])
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record["depth"] for record in records] == [0, 1, 2, 3, 2, 1, 2, 3, 2]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--watch", "--du"],
+        ["--watch", "--summary"],
+        ["--watch", "--format", "json"],
+        ["--watch", "--jobs", "2"],
+        ["--watch", "--cache", "scan.cache"],
+        ["--watch", "--stats"],
+        ["--watch", "--output", "tree.txt"],
+        ["--watch", "--encoding", "utf-16"],
+        ["--summary", "--format", "ndjson"],
+    ],
+)
+def test_incompatible_options(capsys, options):
+    with pytest.raises(SystemExit) as excinfo:
+        main([str(root_path), *options])
+    assert excinfo.value.code == 2
+    assert "error: --" in capsys.readouterr().err
+
+
+def test_watch_exits_quietly_when_the_reader_goes_away(tmp_path):
+    (tmp_path / "a.txt").touch()
+    env = dict(os.environ, PYTHONPATH=str(src_path))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "ascii_tree.cli", str(tmp_path), "--watch", "0.05"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+    try:
+        assert process.stdout.readline()
+        process.stdout.close()
+        # the next redraw writes to the closed pipe
+        (tmp_path / "b.txt").touch()
+        assert process.wait(timeout=30) == 1
+        assert b"Traceback" not in process.stderr.read()
+    finally:
+        process.kill()
+        process.stderr.close()
@@ -1,6 +1,18 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+
 import pytest
 from pathlib import Path
-from ascii_tree import render, renderable_dir_tree
+import ascii_tree
+from ascii_tree import (
+    arenderable_dir_tree,
+    DirTreeWatcher,
+    render,
+    renderable_dir_tree,
+)
 
 this_dir = Path(__file__).parent / "fixtures"
 root_path = this_dir / "root_dir"
@@ -109,5 +121,597 @@ def test_renderable_dir_tree_ellipsis_after_max_files_false():
 
     assert render(files_dir) == expected_output
 
+
+@pytest.fixture
+def deny_child_dir_one(monkeypatch):
+    real_scandir = os.scandir
+
+    def scandir(path):
+        if Path(path).name == "child_dir_one":
+            raise PermissionError(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"max_dir_depth": 2},
+        {"max_file_count": 1},
+        {"recursive": False},
+        {"file_filter": lambda path: "one" in path.name},
+        {"dir_filter": lambda path: "one" not in path.name},
+    ],
+)
+def test_renderable_dir_tree_workers_match_serial(options):
+    serial = render(renderable_dir_tree(this_dir, **options))
+    parallel = render(renderable_dir_tree(this_dir, workers=4, **options))
+    assert parallel == serial
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"max_dir_depth": 2},
+        {"max_file_count": 1, "workers": 1},
+        {"dir_filter": lambda path: "one" not in path.name},
+    ],
+)
+def test_arenderable_dir_tree_matches_sync(options):
+    sync_options = {k: v for k, v in options.items() if k != "workers"}
+    expected = render(renderable_dir_tree(this_dir, **sync_options))
+    root = asyncio.run(arenderable_dir_tree(this_dir, **options))
+    assert render(root) == expected
+
+
+def test_arenderable_dir_tree_permission_denied(deny_child_dir_one):
+    root = asyncio.run(
+        arenderable_dir_tree(
+            root_path, dir_filter=lambda path: path.name != "child_dir_two"
+        )
+    )
+    assert render(root) == (
+        "root_dir /\n" "└─ child_dir_one[Permission Denied] /\n"
+    )
+    with pytest.raises(PermissionError):
+        asyncio.run(arenderable_dir_tree(root_path, skip_if_no_permission=False))
+
+
+@pytest.mark.parametrize("workers", [None, 4])
+def test_renderable_dir_tree_permission_denied(deny_child_dir_one, workers):
+    root = renderable_dir_tree(
+        root_path,
+        dir_filter=lambda path: path.name != "child_dir_two",
+        workers=workers,
+    )
+
+    expected_output = "root_dir /\n" "└─ child_dir_one[Permission Denied] /\n"
+
+    assert render(root) == expected_output
+
+
+@pytest.mark.parametrize("workers", [None, 4])
+def test_renderable_dir_tree_permission_denied_raises(deny_child_dir_one, workers):
+    with pytest.raises(PermissionError):
+        renderable_dir_tree(root_path, skip_if_no_permission=False, workers=workers)
+
+
+def test_renderable_dir_tree_stats(deny_child_dir_one):
+    stats = ascii_tree.Stats()
+    root = renderable_dir_tree(
+        root_path, file_filter=lambda path: True, stats=stats
+    )
+    assert stats.nodes == 6
+    assert stats.dirs_listed == 4
+    assert stats.entries_listed == 5
+    assert stats.permission_errors == 1
+    assert stats.callback_calls == 2
+    assert render(root, stats=stats).count("\n") == stats.lines == 6
+    assert set(stats.phase_seconds) == {"build", "listing", "callbacks", "render"}
+    assert "dirs listed" in stats.summary()
+
+
+def age_dirs(root):
+    """Backdate every directory's mtime so the watcher trusts it."""
+    past = time.time() - 60
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (past, past))
+
+
+@pytest.fixture
+def watched_dir(tmp_path):
+    for name in ("one", "two"):
+        (tmp_path / name / "sub").mkdir(parents=True)
+        (tmp_path / name / "file.txt").touch()
+    age_dirs(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def count_scans(monkeypatch):
+    scanned = []
+    scan_dir = ascii_tree._scan_dir
+
+    def counting_scan_dir(path):
+        scanned.append(Path(path).name)
+        return scan_dir(path)
+
+    monkeypatch.setattr(ascii_tree, "_scan_dir", counting_scan_dir)
+    return scanned
+
+
+def test_dir_tree_watcher_matches_renderable_dir_tree(watched_dir):
+    watcher = DirTreeWatcher(watched_dir, max_dir_depth=2)
+    assert render(watcher.tree) == render(
+        renderable_dir_tree(watched_dir, max_dir_depth=2)
+    )
+
+
+def test_dir_tree_watcher_no_changes(watched_dir, count_scans):
+    watcher = DirTreeWatcher(watched_dir)
+    count_scans.clear()
+    assert watcher.refresh() == []
+    assert count_scans == []
+
+
+def test_dir_tree_watcher_relists_changed_dirs(watched_dir, count_scans):
+    watcher = DirTreeWatcher(watched_dir)
+    one = watcher.tree.children[
+        [child.display for child in watcher.tree.children].index("one /")
+    ]
+    count_scans.clear()
+    (watched_dir / "one" / "new.txt").touch()
+    assert watcher.refresh() == [one]
+    assert count_scans == ["one"]
+    assert render(watcher.tree) == render(renderable_dir_tree(watched_dir))
+
+
+def test_dir_tree_watcher_added_and_removed_dirs(watched_dir):
+    watcher = DirTreeWatcher(watched_dir)
+    (watched_dir / "one" / "sub").rmdir()
+    (watched_dir / "two" / "sub" / "deeper").mkdir()
+    (watched_dir / "three").mkdir()
+    watcher.refresh()
+    assert render(watcher.tree) == render(renderable_dir_tree(watched_dir))
+    assert str(watched_dir / "one" / "sub") not in watcher._dirs
+    assert str(watched_dir / "three") in watcher._dirs
+
+
+def test_dir_tree_watcher_works_with_render_cache(watched_dir):
+    watcher = DirTreeWatcher(watched_dir)
+    cache = ascii_tree.RenderCache()
+    cache.render(watcher.tree)
+    (watched_dir / "two" / "sub" / "new.txt").touch()
+    cache.invalidate(*watcher.refresh())
+    assert cache.render(watcher.tree) == render(renderable_dir_tree(watched_dir))
+
+
+def test_scan_cache_reuses_unchanged_listings(
+    watched_dir, tmp_path_factory, count_scans
+):
+    cache_path = tmp_path_factory.mktemp("cache") / "scan.cache"
+    expected = render(renderable_dir_tree(watched_dir))
+    count_scans.clear()
+
+    assert render(renderable_dir_tree(watched_dir, cache=cache_path)) == expected
+    assert len(count_scans) == 5
+    count_scans.clear()
+    assert render(renderable_dir_tree(watched_dir, cache=cache_path)) == expected
+    assert count_scans == []
+
+    (watched_dir / "two" / "new.txt").touch()
+    root = renderable_dir_tree(watched_dir, cache=str(cache_path))
+    assert count_scans == ["two"]
+    assert render(root) == render(renderable_dir_tree(watched_dir))
+
+
+def test_scan_cache_notices_permission_changes(watched_dir, count_scans):
+    cache = ascii_tree.ScanCache()
+    renderable_dir_tree(watched_dir, cache=cache)
+    # a chmod changes the directory's ctime, but not its mtime
+    mode = (watched_dir / "two").stat().st_mode
+    os.chmod(watched_dir / "two", mode & ~0o004)
+    count_scans.clear()
+    renderable_dir_tree(watched_dir, cache=cache)
+    assert count_scans == ["two"]
+
+
+def test_scan_cache_with_workers_and_filters(watched_dir):
+    cache = ascii_tree.ScanCache()
+    renderable_dir_tree(watched_dir, cache=cache, workers=4)
+    options = dict(dir_filter=lambda path: path.name != "sub", max_file_count=0)
+    assert render(renderable_dir_tree(watched_dir, cache=cache, **options)) == (
+        render(renderable_dir_tree(watched_dir, **options))
+    )
+
+
+def test_scan_cache_drops_removed_dirs(watched_dir, tmp_path_factory):
+    cache_path = tmp_path_factory.mktemp("cache") / "scan.cache"
+    renderable_dir_tree(watched_dir, cache=cache_path)
+    (watched_dir / "one" / "sub").rmdir()
+    age_dirs(watched_dir)
+    renderable_dir_tree(watched_dir, cache=cache_path)
+    cache = ascii_tree.ScanCache(cache_path)
+    assert len(cache) == 4
+    assert str(watched_dir / "one" / "sub") not in cache._entries
+
+
+def test_scan_cache_keeps_dirs_a_shallower_scan_skipped(
+    watched_dir, tmp_path_factory, count_scans
+):
+    cache_path = tmp_path_factory.mktemp("cache") / "scan.cache"
+    renderable_dir_tree(watched_dir, cache=cache_path)
+    renderable_dir_tree(watched_dir, cache=cache_path, max_dir_depth=1)
+    assert len(ascii_tree.ScanCache(cache_path)) == 5
+    count_scans.clear()
+    renderable_dir_tree(watched_dir, cache=cache_path)
+    assert count_scans == []
+
+
+def test_scan_cache_drops_dirs_below_removed_dirs(watched_dir, tmp_path_factory):
+    cache_path = tmp_path_factory.mktemp("cache") / "scan.cache"
+    (watched_dir / "one" / "sub" / "deeper").mkdir()
+    age_dirs(watched_dir)
+    renderable_dir_tree(watched_dir, cache=cache_path)
+    shutil.rmtree(watched_dir / "one")
+    age_dirs(watched_dir)
+    renderable_dir_tree(watched_dir, cache=cache_path, max_dir_depth=1)
+    entries = ascii_tree.ScanCache(cache_path)._entries
+    expected = [watched_dir, watched_dir / "two", watched_dir / "two" / "sub"]
+    assert sorted(entries) == sorted(str(path) for path in expected)
+
+
+def test_scan_cache_ignores_unreadable_files(watched_dir, tmp_path_factory):
+    cache_path = tmp_path_factory.mktemp("cache") / "scan.cache"
+    cache_path.write_bytes(b"not a cache")
+    assert len(ascii_tree.ScanCache(cache_path)) == 0
+    root = renderable_dir_tree(watched_dir, cache=cache_path)
+    assert render(root) == render(renderable_dir_tree(watched_dir))
+    assert len(ascii_tree.ScanCache(cache_path)) == 5
+
+
+def test_scan_cache_async(watched_dir):
+    cache = ascii_tree.ScanCache()
+    root = asyncio.run(arenderable_dir_tree(watched_dir, cache=cache))
+    assert render(root) == render(renderable_dir_tree(watched_dir))
+    assert len(cache) == 5
+
+
+@pytest.fixture
+def sized_dir(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "top.bin").write_bytes(b"x" * 100)
+    (tmp_path / "a" / "one.bin").write_bytes(b"x" * 20)
+    (tmp_path / "a" / "b" / "two.bin").write_bytes(b"x" * 3)
+    (tmp_path / "a" / "b" / "three.bin").write_bytes(b"")
+    return tmp_path
+
+
+def test_renderable_dir_tree_totals(sized_dir):
+    root = renderable_dir_tree(sized_dir, totals=True)
+    assert isinstance(root, ascii_tree.DirRenderNode)
+    assert (root.size, root.file_count, root.dir_count) == (123, 4, 2)
+    a = next(child for child in root.children if child.display == "a /")
+    assert (a.size, a.file_count, a.dir_count) == (23, 3, 1)
+    # without totals_display, nothing is added to the output
+    assert render(root) == render(renderable_dir_tree(sized_dir))
+
+
+def test_renderable_dir_tree_totals_json(sized_dir):
+    root = renderable_dir_tree(sized_dir, totals=True)
+    records = [json.loads(line) for line in ascii_tree.iter_ndjson(root)]
+    assert records[0]["file_count"] == 4
+    a = next(record for record in records if record["display"] == "a /")
+    assert (a["depth"], a["size"], a["file_count"], a["dir_count"]) == (1, 23, 3, 1)
+    # files have no totals
+    files = [record for record in records if not record["display"].endswith("/")]
+    assert all("size" not in record for record in files)
+
+
+def test_renderable_dir_tree_totals_display(sized_dir):
+    root = renderable_dir_tree(
+        sized_dir,
+        max_dir_depth=2,
+        file_filter=lambda path: path.name != "top.bin",
+        totals_display=ascii_tree.display_with_totals,
+    )
+    # b wasn't listed, so the totals above it are lower bounds
+    assert root.display == f"{sized_dir.name} / (at least 1 file, 20 B)"
+    a = root.children[0]
+    assert a.display == "a / (at least 1 file, 20 B)"
+    # directories that weren't listed have no totals to show
+    assert a.children[0].display == "b / ..."
+    assert a.children[0].partial
+    records = [json.loads(line) for line in ascii_tree.iter_ndjson(root)]
+    dirs = [record for record in records if "size" in record]
+    assert [record.get("partial") for record in dirs] == [True, True, True]
+    full = renderable_dir_tree(sized_dir, totals=True)
+    assert not full.partial
+    assert '"partial"' not in ascii_tree.render_json(full)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"workers": 4},
+        {"cache": "in-memory"},
+        {"asynchronous": True},
+    ],
+)
+def test_renderable_dir_tree_totals_match(sized_dir, options):
+    options = dict(options, totals_display=ascii_tree.display_with_totals)
+    if options.pop("asynchronous", False):
+        root = asyncio.run(arenderable_dir_tree(sized_dir, **options))
+    else:
+        if options.get("cache"):
+            # a second scan gets its listings, without sizes, from the cache
+            options["cache"] = ascii_tree.ScanCache()
+            age_dirs(sized_dir)
+            renderable_dir_tree(sized_dir, **options)
+        root = renderable_dir_tree(sized_dir, **options)
+    expected = renderable_dir_tree(
+        sized_dir, totals_display=ascii_tree.display_with_totals
+    )
+    assert render(root) == render(expected)
+    assert root.size == 123
+
+
+def test_renderable_dir_tree_totals_permission_denied(deny_child_dir_one):
+    root = renderable_dir_tree(
+        root_path, totals_display=ascii_tree.display_with_totals
+    )
+    assert (root.file_count, root.dir_count) == (2, 3)
+    denied = next(c for c in root.children if "child_dir_one" in c.display)
+    assert denied.display == "child_dir_one[Permission Denied] /"
+
+
+def test_renderable_dir_tree_totals_not_flat():
+    with pytest.raises(ValueError):
+        renderable_dir_tree(root_path, flat=True, totals=True)
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [(0, "0 B"), (1023, "1023 B"), (1024, "1.0 KiB"), (5 * 2**20, "5.0 MiB")],
+)
+def test_format_size(size, expected):
+    assert ascii_tree.format_size(size) == expected
+
+
+@pytest.fixture
+def repo_dir(tmp_path):
+    for path in (
+        ".git/HEAD",
+        ".gitignore",
+        "app.py",
+        "debug.log",
+        "build/out.o",
+        "node_modules/pkg/index.js",
+        "src/main.py",
+        "src/notes.txt",
+        "src/logs/.gitignore",
+        "src/logs/keep.log",
+        "src/logs/drop.log",
+        "src/build",
+    ):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).touch()
+    (tmp_path / ".gitignore").write_text("# build output\nbuild/\n*.log\n")
+    (tmp_path / "src" / "logs" / ".gitignore").write_text("!keep.log\n")
+    return tmp_path
+
+
+def tree_paths(node, prefix=""):
+    """The relative paths of every node below `node`, dirs ending in '/'."""
+    paths = set()
+    for child in node.children:
+        name = child.display.replace(" /", "/")
+        paths.add(prefix + name)
+        paths.update(tree_paths(child, prefix + name))
+    return paths
+
+
+def test_renderable_dir_tree_gitignore(repo_dir, count_scans):
+    root = renderable_dir_tree(repo_dir, gitignore=True, exclude=["node_modules"])
+    assert tree_paths(root) == {
+        ".gitignore",
+        "app.py",
+        "src/",
+        "src/main.py",
+        "src/notes.txt",
+        # a file named like an ignored directory is kept
+        "src/build",
+        "src/logs/",
+        "src/logs/.gitignore",
+        # re-included by the nested .gitignore
+        "src/logs/keep.log",
+    }
+    # excluded directories are never listed
+    assert sorted(count_scans) == sorted([repo_dir.name, "src", "logs"])
+
+
+def test_renderable_dir_tree_include_exclude(repo_dir):
+    root = renderable_dir_tree(
+        repo_dir, include=["*.py", "src/*.txt"], exclude=[".git/", "node_modules/"]
+    )
+    assert tree_paths(root) == {
+        "app.py",
+        "build/",
+        "src/",
+        "src/main.py",
+        "src/notes.txt",
+        "src/logs/",
+    }
+
+
+@pytest.mark.parametrize(
+    "include, kept",
+    [
+        (["src/"], {"src/main.py", "src/notes.txt", "src/build", "src/logs/keep.log"}),
+        (["logs/"], {"src/logs/keep.log"}),
+        (["/logs/"], set()),
+        (["src/", "!*.log", "*.txt"], {"src/main.py", "src/notes.txt", "src/build"}),
+        (["*.py", "src/logs/"], {"app.py", "src/main.py", "src/logs/keep.log"}),
+    ],
+)
+def test_renderable_dir_tree_include_dirs(repo_dir, include, kept):
+    root = renderable_dir_tree(
+        repo_dir,
+        include=include,
+        exclude=[".git/", "node_modules/", "drop.log", ".gitignore"],
+    )
+    files = {path for path in tree_paths(root) if not path.endswith("/")}
+    assert files == kept
+
+
+def test_renderable_dir_tree_include_after_negation(repo_dir):
+    # keep.log is re-included by src/logs/.gitignore, and by an exclude
+    # pattern, but neither lets it past `include`
+    for options in (
+        {"gitignore": True},
+        {"exclude": ["*.log", "!keep.log"]},
+    ):
+        root = renderable_dir_tree(repo_dir / "src", include=["*.py"], **options)
+        assert tree_paths(root) == {"main.py", "logs/"}
+        root = renderable_dir_tree(
+            repo_dir / "src", include=["*.py", "keep.*"], **options
+        )
+        assert tree_paths(root) == {"main.py", "logs/", "logs/keep.log"}
+
+
+@pytest.mark.parametrize(
+    "exclude, kept",
+    [
+        (["*.log", "!keep.log"], {"keep.log"}),
+        (["!keep.log", "*.log"], set()),
+        (["*.log", "!*.log", "drop.*"], {"keep.log"}),
+        (["/keep.log"], {"drop.log"}),
+        # paths are relative to the root, which is logs/ itself
+        (["logs/keep.log"], {"keep.log", "drop.log"}),
+        (["**/drop.log"], {"keep.log"}),
+        (["[!d]*.log"], {"drop.log"}),
+    ],
+)
+def test_renderable_dir_tree_exclude_order(repo_dir, exclude, kept):
+    logs = repo_dir / "src" / "logs"
+    root = renderable_dir_tree(logs, exclude=[".gitignore", *exclude])
+    assert tree_paths(root) == kept
+
+
+@pytest.mark.parametrize(
+    "options", [{"workers": 4}, {"cache": "in-memory"}, {"asynchronous": True}]
+)
+def test_renderable_dir_tree_gitignore_matches(repo_dir, options):
+    options = dict(options, gitignore=True)
+    if options.pop("asynchronous", False):
+        root = asyncio.run(arenderable_dir_tree(repo_dir, **options))
+    else:
+        if options.get("cache"):
+            options["cache"] = ascii_tree.ScanCache()
+        root = renderable_dir_tree(repo_dir, **options)
+    expected = renderable_dir_tree(repo_dir, gitignore=True)
+    assert tree_paths(root) == tree_paths(expected)
+
+
+def test_dir_tree_watcher_gitignore(repo_dir):
+    watcher = DirTreeWatcher(repo_dir, gitignore=True)
+    assert tree_paths(watcher.tree) == tree_paths(
+        renderable_dir_tree(repo_dir, gitignore=True)
+    )
+
+
+@pytest.fixture
+def sortable_dir(tmp_path):
+    # (name, size, age in seconds)
+    for name, size, age in [
+        ("file10.txt", 5, 40),
+        ("file2.txt", 50, 10),
+        ("File3.txt", 1, 30),
+        ("file1.txt", 20, 20),
+    ]:
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    (tmp_path / "dir").mkdir()
+    return tmp_path
+
+
+def child_names(node):
+    return [child.display for child in node.children]
+
+
+@pytest.mark.parametrize(
+    "sort, expected",
+    [
+        ("name", ["File3.txt", "dir /", "file1.txt", "file10.txt", "file2.txt"]),
+        ("natural", ["dir /", "file1.txt", "file2.txt", "File3.txt", "file10.txt"]),
+        ("size", ["file2.txt", "file1.txt", "file10.txt", "File3.txt"]),
+        ("mtime", ["dir /", "file2.txt", "file1.txt", "File3.txt", "file10.txt"]),
+    ],
+)
+def test_renderable_dir_tree_sort(sortable_dir, sort, expected):
+    names = child_names(renderable_dir_tree(sortable_dir, sort=sort))
+    if sort == "size":
+        # a directory's own size depends on the file system
+        names.remove("dir /")
+    assert names == expected
+
+
+def test_renderable_dir_tree_dirs_first(sortable_dir):
+    root = renderable_dir_tree(sortable_dir, sort="natural", dirs_first=True)
+    assert child_names(root)[0] == "dir /"
+    unsorted = renderable_dir_tree(sortable_dir, sort=None, dirs_first=True)
+    assert child_names(unsorted)[0] == "dir /"
+
+
+def test_renderable_dir_tree_top_files(sortable_dir):
+    root = renderable_dir_tree(
+        sortable_dir, sort="mtime", max_file_count=2, totals=True
+    )
+    assert child_names(root) == ["dir /", "file2.txt", "file1.txt", "..."]
+    # the files max_file_count hides are still counted
+    assert root.file_count == 4
+    assert root.size == 76
+    assert not root.partial
+
+
+def test_renderable_dir_tree_unsorted_max_files_totals(sortable_dir):
+    root = renderable_dir_tree(
+        sortable_dir,
+        sort=None,
+        max_file_count=1,
+        file_filter=lambda path: path.name != "file2.txt",
+        totals=True,
+    )
+    assert child_names(root)[-1] == "..."
+    assert (root.file_count, root.size, root.partial) == (3, 26, False)
+
+
+def test_renderable_dir_tree_unsorted_max_files_filters_lazily(sortable_dir):
+    checked = []
+
+    def file_filter(path):
+        checked.append(path.name)
+        return True
+
+    root = renderable_dir_tree(
+        sortable_dir, sort=None, max_file_count=2, file_filter=file_filter
+    )
+    assert len(checked) == 3
+    assert [name for name in child_names(root) if name != "dir /"] == [
+        *checked[:2],
+        "...",
+    ]
+
+
+def test_renderable_dir_tree_unknown_sort():
+    with pytest.raises(ValueError):
+        renderable_dir_tree(root_path, sort="color")
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,179 @@
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from ascii_tree import (
+    FlatTree,
+    iter_ndjson,
+    iter_render,
+    render,
+    render_json,
+    renderable_dir_tree,
+    TextRenderNode,
+)
+from ascii_tree.styles import basic_style, clean_style, solid_line_style
+
+fixtures_path = Path(__file__).parent / "fixtures"
+
+
+class TestFlatTree:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.root = TextRenderNode("root")
+        child_one = TextRenderNode("child_one")
+        child_two = TextRenderNode("child_two")
+        grandchild_one = TextRenderNode("grandchild_one")
+        grandchild_two = TextRenderNode("grandchild_two")
+        self.root.children.extend([child_one, child_two])
+        child_one.children.extend([grandchild_one, grandchild_two])
+        grandchild_one.children.extend(
+            [
+                TextRenderNode("great_grandchild_one"),
+                TextRenderNode("great_grandchild_two"),
+                TextRenderNode("great_grandchild_three"),
+            ]
+        )
+        self.tree = FlatTree.from_node(self.root)
+
+    def test_from_node(self):
+        assert len(self.tree) == 8
+        assert list(self.tree.depths) == [0, 1, 2, 3, 3, 3, 2, 1]
+        assert list(self.tree.last_flags) == [1, 0, 0, 0, 0, 1, 1, 1]
+        assert self.tree.display(2) == "grandchild_one"
+
+    @pytest.mark.parametrize("style", [solid_line_style, clean_style, basic_style])
+    def test_render_matches_nodes(self, style):
+        assert render(self.tree, style) == render(self.root, style)
+        assert render(self.tree, style, width=3, spacing=0) == render(
+            self.root, style, width=3, spacing=0
+        )
+
+    @pytest.mark.parametrize(
+        "limits",
+        [
+            {"max_depth": 0},
+            {"max_depth": 2},
+            {"max_children": 0},
+            {"max_children": 1},
+            {"max_children": 2, "max_depth": 2},
+            {"max_lines": 4},
+        ],
+    )
+    def test_render_limits_match_nodes(self, limits):
+        assert render(self.tree, **limits) == render(self.root, **limits)
+
+    @pytest.mark.parametrize(
+        "limits",
+        [
+            {},
+            {"max_depth": 0},
+            {"max_depth": 2},
+            {"max_children": 0},
+            {"max_children": 1},
+            {"max_children": 2, "max_depth": 2},
+        ],
+    )
+    def test_json_matches_nodes(self, limits):
+        assert render_json(self.tree, **limits) == render_json(self.root, **limits)
+        assert list(iter_ndjson(self.tree, **limits)) == list(
+            iter_ndjson(self.root, **limits)
+        )
+
+    def test_to_node_round_trip(self):
+        assert render(self.tree.to_node()) == render(self.root)
+
+    def test_append_rejects_skipped_depth(self):
+        tree = FlatTree()
+        tree.append("root", 0)
+        with pytest.raises(ValueError):
+            tree.append("grandchild", 2)
+        with pytest.raises(ValueError):
+            tree.append("second root", 0)
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {"split_depth": 1},
+            {"split_depth": 2},
+            {"split_depth": 2, "max_depth": 2},
+            {"split_depth": 1, "max_depth": 2, "max_children": 2},
+            {"split_depth": 1, "style": clean_style, "width": 3},
+        ],
+    )
+    def test_render_with_workers_matches_serial(self, options):
+        serial_options = dict(options)
+        del serial_options["split_depth"]
+        expected = render(self.root, **serial_options)
+        assert render(self.tree, workers=2, **options) == expected
+
+    def test_render_with_workers_needs_flat_tree(self):
+        with pytest.raises(ValueError):
+            render(self.root, workers=2)
+        with pytest.raises(ValueError):
+            render(self.tree, workers=2, split_depth=0)
+
+    def test_skips_deep_subtrees(self):
+        # depths of 256 and up have zero low bytes, which mustn't be mistaken
+        # for shallower rows when skipping subtrees
+        chain = node = TextRenderNode("0")
+        for i in range(1, 600):
+            child = TextRenderNode(str(i))
+            node.children.extend([child, TextRenderNode(f"{i}b")])
+            node = child
+        tree = FlatTree.from_node(chain)
+        for limits in ({"max_children": 1}, {"max_depth": 300}):
+            assert render(tree, **limits) == render(chain, **limits)
+
+    def test_subtree_end_matches_scan(self):
+        # deep chains (with depths past 256) whose side branches are either
+        # last children or followed by another sibling
+        chain = node = TextRenderNode("0")
+        for i in range(1, 400):
+            child = TextRenderNode(str(i))
+            side = TextRenderNode(f"{i}b", [TextRenderNode(f"{i}c")])
+            siblings = [child, side] if i % 3 else [side, child, TextRenderNode("x")]
+            node.children.extend(siblings)
+            node = child
+        tree = FlatTree.from_node(chain)
+        depths = tree.depths
+        raw_depths = depths.tobytes()
+        for row in range(1, len(tree)):
+            end = row + 1
+            while end < len(tree) and depths[end] > depths[row]:
+                end += 1
+            assert tree._subtree_end(row, raw_depths) == end
+        for limits in ({"max_children": 1}, {"max_depth": 260}):
+            assert render(tree, **limits) == render(chain, **limits)
+
+    def test_deep_chain_memory_grows_with_depth(self):
+        # a line 5,000 levels down is ~15 KB; holding a prefix per level
+        # would take ~40 MB, one shared prefix only a few times the line
+        tree = FlatTree()
+        for depth in range(5_000):
+            tree.append(str(depth), depth)
+        tracemalloc.start()
+        try:
+            for _ in iter_render(tree):
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 2_000_000
+
+    def test_non_ascii_display(self):
+        tree = FlatTree()
+        tree.append("räksmörgås", 0)
+        tree.append("日本", 1)
+        assert render(tree) == "räksmörgås\n└─ 日本\n"
+
+
+def test_renderable_dir_tree_flat():
+    for options in ({}, {"max_dir_depth": 2}, {"max_file_count": 1}):
+        tree = renderable_dir_tree(fixtures_path, flat=True, **options)
+        assert isinstance(tree, FlatTree)
+        assert render(tree) == render(renderable_dir_tree(fixtures_path, **options))
+
+
+if __name__ == "__main__":
+    pytest.main()
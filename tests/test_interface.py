@@ -1,5 +1,19 @@
+import itertools
+import pickle
+import sqlite3
+
 import pytest
-from ascii_tree import TextRenderNode, renderable, renderable_from_parents
+from ascii_tree import (
+    LazyRenderNode,
+    Stats,
+    TextRenderNode,
+    iter_render,
+    render,
+    renderable,
+    renderable_from_parents,
+    renderable_from_paths,
+    renderable_from_rows,
+)
 
 
 class TestTextRenderNode:
@@ -8,6 +22,54 @@ class TestTextRenderNode:
         assert node.display == "Test"
         assert node.children == []
 
+    def test_slots(self):
+        node = TextRenderNode("Test")
+        assert not hasattr(node, "__dict__")
+        with pytest.raises(AttributeError):
+            node.something_else = 1
+
+    def test_leaves_share_empty_children(self):
+        one, two = TextRenderNode("one"), TextRenderNode("two")
+        assert one._children is two._children
+        assert render(one) == "one\n"
+        assert one._children is two._children
+
+    def test_leaf_children_is_a_list(self):
+        node = TextRenderNode("Test")
+        children = node.children
+        assert type(children) is list
+        assert node.children is children
+        assert TextRenderNode("other")._children == ()
+        children.append(TextRenderNode("b"))
+        children.extend([TextRenderNode("c"), TextRenderNode("a")])
+        node.children.sort(key=lambda child: child.display)
+        assert [child.display for child in node.children] == ["a", "b", "c"]
+        assert type(TextRenderNode("leaf").children[:]) is list
+        assert TextRenderNode("leaf").children.copy() == []
+        leaf = TextRenderNode("leaf")
+        assert leaf.children + [node] == [node]
+
+    def test_children_augmented_assignment_on_leaf(self):
+        node = TextRenderNode("Test")
+        node.children += [TextRenderNode("a")]
+        assert len(node.children) == 1
+        assert render(node) == "Test\n└─ a\n"
+
+    def test_children_assigned_to_itself_on_leaf(self):
+        node = TextRenderNode("Test")
+        node.children = node.children
+        assert len(node.children) == 0
+        assert render(node) == "Test\n"
+        node.children.append(TextRenderNode("a"))
+        assert render(node) == "Test\n└─ a\n"
+
+    def test_pickle_round_trip(self):
+        node = TextRenderNode("root", [TextRenderNode("child")])
+        copied = pickle.loads(pickle.dumps(node))
+        assert copied.display == "root"
+        assert copied.children[0].display == "child"
+        assert copied.children[0].children == []
+
 
 class TestRenderable:
     class DummyObject:
@@ -74,6 +136,73 @@ class TestRenderable:
         assert node.display == "Foo"
         assert node.children == []
 
+    def test_renderable_stats(self):
+        children = [self.DummyWithDefaultAttrs("Bar", [])]
+        obj = self.DummyWithDefaultAttrs("Test", children)
+        stats = Stats()
+        renderable(obj, display_function=lambda obj: obj.display, stats=stats)
+        assert stats.nodes == 2
+        assert stats.callback_calls == 1
+        assert set(stats.phase_seconds) == {"build", "callbacks"}
+
+
+class TestLazyRenderable:
+    class CountingObject:
+        visited = []
+
+        def __init__(self, name, children=()):
+            self.name = name
+            self._children = list(children)
+
+        @property
+        def display(self):
+            self.visited.append(self.name)
+            return self.name
+
+        @property
+        def children(self):
+            self.visited.append(self.name + ".children")
+            return self._children
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Obj = self.CountingObject
+        Obj.visited = []
+        self.root = Obj(
+            "root",
+            [Obj("a", [Obj("a1"), Obj("a2")]), Obj("b", [Obj("b1")])],
+        )
+
+    def test_lazy_renderable_defers_access(self):
+        node = renderable(self.root, lazy=True)
+        assert isinstance(node, LazyRenderNode)
+        assert self.CountingObject.visited == []
+        assert node.display == "root"
+        assert node.display == "root"
+        assert self.CountingObject.visited == ["root"]
+
+    def test_lazy_renderable_only_visits_rendered_nodes(self):
+        node = renderable(self.root, lazy=True)
+        lines = list(itertools.islice(iter_render(node), 2))
+        assert lines == ["root\n", "├─ a\n"]
+        assert "b" not in self.CountingObject.visited
+        assert "a1" not in self.CountingObject.visited
+
+    def test_lazy_matches_eager(self):
+        eager = render(renderable(self.root))
+        assert render(renderable(self.root, lazy=True)) == eager
+
+    def test_lazy_with_interface(self):
+        obj = TestRenderable.DummyObject("Test", [])
+        node = renderable(
+            obj,
+            display_attr="_name",
+            children_method=obj.children_method,
+            lazy=True,
+        )
+        assert node.display == "Test"
+        assert node.children == []
+
 
 class TestRenderableFromParents:
     class DummyObject:
@@ -116,6 +245,41 @@ class TestRenderableFromParents:
         assert [node.display for node in nodes] == ["Root1", "Root2"]
         assert nodes[1].children[0].display == "Child"
 
+    def test_roots_in_first_seen_order(self):
+        roots = [self.DummyObject(f"Root{i}") for i in range(20)]
+        children = [self.DummyObject("Child", parent=root) for root in roots]
+        nodes = renderable_from_parents(
+            children[::-1], parent_attr="parent", display_attr="name"
+        )
+        assert [node.display for node in nodes] == [
+            f"Root{i}" for i in reversed(range(20))
+        ]
+
+    def test_children_in_first_seen_order(self):
+        root = self.DummyObject("Root")
+        objs = [self.DummyObject(f"Child{i}", parent=root) for i in range(5)]
+        nodes = renderable_from_parents(objs, display_attr="name")
+        assert [node.display for node in nodes[0].children] == [
+            f"Child{i}" for i in range(5)
+        ]
+
+    def test_parent_looked_up_once_per_object(self):
+        root = self.DummyObject("Root")
+        middle = self.DummyObject("Middle", parent=root)
+        leaves = [self.DummyObject(f"Leaf{i}", parent=middle) for i in range(3)]
+        calls = []
+
+        def parent_method(obj):
+            calls.append(obj.name)
+            return obj.parent
+
+        nodes = renderable_from_parents(
+            leaves + [middle], parent_method=parent_method, display_attr="name"
+        )
+        assert sorted(calls) == ["Leaf0", "Leaf1", "Leaf2", "Middle", "Root"]
+        assert len(nodes) == 1
+        assert len(nodes[0].children[0].children) == 3
+
     def test_root_callback(self):
         obj = self.DummyWithDifferentParentSentinel("Root")
         obj2 = self.DummyWithDifferentParentSentinel("Child", parent=obj)
@@ -129,6 +293,103 @@ class TestRenderableFromParents:
         assert nodes[0].display == "Root"
         assert nodes[0].children[0].display == "Child"
 
+    def test_stats(self):
+        root = self.DummyObject("Root")
+        leaves = [self.DummyObject(f"Leaf{i}", parent=root) for i in range(3)]
+        stats = Stats()
+        renderable_from_parents(
+            leaves,
+            parent_method=lambda obj: obj.parent,
+            display_attr="name",
+            stats=stats,
+        )
+        assert stats.nodes == 4
+        assert stats.callback_calls == 4
+        assert stats.phase_seconds["build"] >= stats.phase_seconds["callbacks"]
+
+
+class TestRenderableFromPaths:
+    def test_shared_prefixes(self):
+        roots = renderable_from_paths(
+            ["logs/2024/app.log", "logs/2024/db.log", "logs/2025/app.log", "data"]
+        )
+        assert [root.display for root in roots] == ["logs", "data"]
+        assert render(roots[0]) == (
+            "logs\n"
+            "├─ 2024\n"
+            "│  ├─ app.log\n"
+            "│  └─ db.log\n"
+            "└─ 2025\n"
+            "   └─ app.log\n"
+        )
+
+    def test_custom_separator_and_empty_segments(self):
+        roots = renderable_from_paths(
+            ["ascii_tree.styles", "ascii_tree..cli", ".ascii_tree.flat."], sep="."
+        )
+        assert len(roots) == 1
+        assert [c.display for c in roots[0].children] == ["styles", "cli", "flat"]
+
+    def test_consumes_generator(self):
+        paths = (f"bucket/key_{i}" for i in range(1000))
+        roots = renderable_from_paths(paths)
+        assert len(roots[0].children) == 1000
+
+    def test_max_children(self):
+        roots = renderable_from_paths(
+            ["a/1", "a/2", "a/3/x", "a/4", "b", "c"], max_children=2
+        )
+        assert [root.display for root in roots] == ["a", "b", "..."]
+        assert [c.display for c in roots[0].children] == ["1", "2", "..."]
+
+    def test_max_children_without_ellipsis(self):
+        roots = renderable_from_paths(
+            ["a/1", "a/2", "a/3"], max_children=2, ellipsis_after_max_children=False
+        )
+        assert [c.display for c in roots[0].children] == ["1", "2"]
+
+
+class TestRenderableFromRows:
+    def test_parents_first(self):
+        rows = [(1, None, "root"), (2, 1, "a"), (3, 1, "b"), (4, 2, "a1")]
+        roots = renderable_from_rows(rows)
+        assert render(roots[0]) == "root\n├─ a\n│  └─ a1\n└─ b\n"
+
+    def test_children_before_parents(self):
+        rows = [(4, 2, "a1"), (3, 1, "b"), (2, 1, "a"), (1, None, "root")]
+        roots = renderable_from_rows(iter(rows))
+        assert len(roots) == 1
+        assert render(roots[0]) == "root\n├─ b\n└─ a\n   └─ a1\n"
+
+    def test_sqlite_cursor(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("create table t (id integer, parent integer, name text)")
+        connection.executemany(
+            "insert into t values (?, ?, ?)",
+            [(1, None, "root"), (2, 1, "child"), (3, None, "other")],
+        )
+        roots = renderable_from_rows(connection.execute("select * from t"))
+        assert [root.display for root in roots] == ["root", "other"]
+        assert roots[0].children[0].display == "child"
+
+    def test_orphans(self):
+        rows = [(1, None, "root"), (2, 99, "orphan")]
+        with pytest.raises(ValueError, match="99"):
+            renderable_from_rows(rows)
+        roots = renderable_from_rows(rows, orphans_as_roots=True)
+        assert [root.display for root in roots] == ["root", "orphan"]
+
+    def test_cycles(self):
+        rows = [(1, None, "root"), (2, 3, "a"), (3, 2, "b")]
+        with pytest.raises(ValueError, match="Cycle"):
+            renderable_from_rows(rows)
+        with pytest.raises(ValueError, match="Cycle"):
+            renderable_from_rows([(1, 1, "self")])
+
+    def test_duplicate_ids(self):
+        with pytest.raises(ValueError, match="Duplicate"):
+            renderable_from_rows([(1, None, "a"), (1, None, "b")])
+
 
 if __name__ == "__main__":
     pytest.main()
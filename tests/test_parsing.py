@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+from ascii_tree import (
+    detect_style,
+    FlatTree,
+    parse,
+    render,
+    TextRenderNode,
+)
+from ascii_tree.styles import basic_style, clean_style, solid_line_style
+
+
+class TestParse:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.root = TextRenderNode("root")
+        child_one = TextRenderNode("child_one")
+        child_two = TextRenderNode("child_two")
+        grandchild_one = TextRenderNode("grandchild_one")
+        grandchild_two = TextRenderNode("grandchild_two")
+        self.root.children.extend([child_one, child_two])
+        child_one.children.extend([grandchild_one, grandchild_two])
+        grandchild_one.children.extend(
+            [
+                TextRenderNode("great_grandchild_one"),
+                TextRenderNode("great_grandchild_two"),
+            ]
+        )
+        child_two.children.append(TextRenderNode("grandchild_three"))
+
+    @pytest.mark.parametrize("style", [solid_line_style, clean_style, basic_style])
+    @pytest.mark.parametrize("width, spacing", [(1, 1), (3, 0), (2, 4)])
+    def test_round_trip(self, style, width, spacing):
+        text = render(self.root, style, width, spacing)
+        assert detect_style(text) == (style, width, spacing)
+        assert render(parse(text), style, width, spacing) == text
+
+    def test_restyle(self):
+        text = render(self.root, clean_style, width=2)
+        assert render(parse(text)) == render(self.root)
+
+    def test_parse_file_to_flat_tree(self):
+        text = render(self.root, basic_style)
+        tree = parse(io.StringIO(text), flat=True)
+        assert isinstance(tree, FlatTree)
+        assert list(tree.depths) == [0, 1, 2, 3, 3, 2, 1, 2]
+        assert render(tree, basic_style) == text
+
+    def test_display_looks_like_decorations(self):
+        self.root.children[0].display = "├─ │  "
+        self.root.children[1].children[0].display = "   "
+        text = render(self.root)
+        assert render(parse(text, width=1, spacing=1)) == text
+
+    def test_truncated_and_followed_by_summary(self):
+        text = render(self.root, max_children=1)
+        parsed = parse(text + "\n3 directories, 4 files\n")
+        assert render(parsed) == text
+        assert parsed.children[-1].display == "... 1 more"
+
+    def test_only_root(self):
+        assert detect_style("root\n") is None
+        assert parse("root\n").display == "root"
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            parse("")
+        with pytest.raises(ValueError):
+            parse("root\n* child\n")
+        with pytest.raises(ValueError):
+            parse("root\n├─ child\n      └─ orphan\n")
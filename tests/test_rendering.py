@@ -1,11 +1,26 @@
+import io
+import itertools
+import json
+import tracemalloc
+
 import pytest
 
 from ascii_tree import (
+    iter_json,
+    iter_ndjson,
+    iter_render,
+    iter_render_bytes,
     render,
+    RenderCache,
+    render_json,
+    render_to,
+    Stats,
     TextRenderNode,
+    write_json,
 )
 
 from ascii_tree.styles import (
+    compile_style,
     solid_line_style,
     clean_style,
     basic_style,
@@ -71,6 +86,307 @@ class TestTextRenderNode:
 
         assert render(self.root, basic_style) == expected_output
 
+    def test_iter_render_yields_lines(self):
+        lines = list(iter_render(self.root, basic_style))
+        assert len(lines) == 8
+        assert all(line.endswith("\n") for line in lines)
+        assert "".join(lines) == render(self.root, basic_style)
+
+    def test_iter_render_is_lazy(self):
+        lines = iter_render(self.root)
+        assert next(lines) == "root\n"
+        assert next(lines) == "├─ child_one\n"
+
+    def test_render_to_text_file(self):
+        fp = io.StringIO()
+        render_to(self.root, fp, width=2, spacing=2)
+        assert fp.getvalue() == render(self.root, width=2, spacing=2)
+
+    def test_render_to_binary_file(self):
+        fp = io.BytesIO()
+        render_to(self.root, fp)
+        assert fp.getvalue() == render(self.root).encode("utf-8")
+
+    def test_iter_render_bytes(self):
+        chunks = list(iter_render_bytes(self.root, chunk_size=30))
+        assert chunks[0] == b"root\n"
+        assert all(chunk.endswith(b"\n") for chunk in chunks)
+        assert b"".join(chunks) == render(self.root).encode("utf-8")
+
+    def test_iter_render_bytes_encodes_bom_once(self):
+        chunks = iter_render_bytes(self.root, encoding="utf-16", chunk_size=1)
+        assert b"".join(chunks) == render(self.root).encode("utf-16")
+
+    def test_render_to_end(self):
+        fp = io.BytesIO()
+        render_to(self.root, fp, encoding="utf-16", end="\n2 files\n")
+        assert fp.getvalue() == (render(self.root) + "\n2 files\n").encode("utf-16")
+        text_fp = io.StringIO()
+        render_to(self.root, text_fp, end="\n")
+        assert text_fp.getvalue() == render(self.root) + "\n"
+
+    def test_render_json(self):
+        document = json.loads(render_json(self.root))
+        assert document["display"] == "root"
+        child_one, child_two = document["children"]
+        assert [node["display"] for node in child_one["children"]] == [
+            "grandchild_one",
+            "grandchild_two",
+        ]
+        assert child_two == {"display": "child_two"}
+
+    def test_iter_json_yields_one_node_at_a_time(self):
+        pieces = list(iter_json(self.root))
+        assert len(pieces) == 9
+        assert "".join(pieces) == render_json(self.root)
+        assert render_json(self.root).endswith("}\n")
+
+    def test_render_json_limits(self):
+        document = json.loads(render_json(self.root, max_depth=2, max_children=1))
+        assert document == {
+            "display": "root",
+            "children": [
+                {
+                    "display": "child_one",
+                    "children": [{"display": "grandchild_one"}],
+                    "more": 1,
+                }
+            ],
+            "more": 1,
+        }
+        assert json.loads(render_json(self.root, max_children=0)) == {
+            "display": "root",
+            "more": 2,
+        }
+
+    def test_iter_ndjson(self):
+        records = [json.loads(line) for line in iter_ndjson(self.root)]
+        assert [record["depth"] for record in records] == [0, 1, 2, 3, 3, 3, 2, 1]
+        assert [record["display"] for record in records] == [
+            line.lstrip("│├└─ ") for line in render(self.root).splitlines()
+        ]
+
+    def test_iter_ndjson_max_children(self):
+        lines = list(iter_ndjson(self.root, max_children=1))
+        assert all(line.endswith("\n") for line in lines)
+        assert [json.loads(line) for line in lines] == [
+            {"depth": 0, "display": "root"},
+            {"depth": 1, "display": "child_one"},
+            {"depth": 2, "display": "grandchild_one"},
+            {"depth": 3, "display": "great_grandchild_one"},
+            {"depth": 3, "more": 2},
+            {"depth": 2, "more": 1},
+            {"depth": 1, "more": 1},
+        ]
+
+    @pytest.mark.parametrize("ndjson", [False, True])
+    def test_write_json(self, ndjson):
+        expected = "".join((iter_ndjson if ndjson else iter_json)(self.root))
+        text_fp = io.StringIO()
+        write_json(self.root, text_fp, ndjson)
+        assert text_fp.getvalue() == expected
+        binary_fp = io.BytesIO()
+        write_json(self.root, binary_fp, ndjson, encoding="utf-16")
+        assert binary_fp.getvalue() == expected.encode("utf-16")
+
+    def test_render_max_depth(self):
+        expected_output = (
+            "root\n"
+            "├─ child_one\n"
+            "│  ├─ grandchild_one\n"
+            "│  └─ grandchild_two\n"
+            "└─ child_two\n"
+        )
+
+        assert render(self.root, max_depth=2) == expected_output
+        assert render(self.root, max_depth=0) == "root\n"
+
+    def test_render_max_children(self):
+        expected_output = (
+            "root\n"
+            "├─ child_one\n"
+            "│  ├─ grandchild_one\n"
+            "│  │  ├─ great_grandchild_one\n"
+            "│  │  └─ ... 2 more\n"
+            "│  └─ ... 1 more\n"
+            "└─ ... 1 more\n"
+        )
+
+        assert render(self.root, max_children=1) == expected_output
+
+    def test_render_max_lines(self):
+        output = render(self.root, max_lines=3)
+        assert output == "root\n├─ child_one\n│  ├─ grandchild_one\n"
+
+    def test_render_max_bytes(self):
+        full = render(self.root)
+        lines = full.splitlines(keepends=True)
+        budget = len("".join(lines[:2]).encode("utf-8"))
+        assert render(self.root, max_bytes=budget) == "".join(lines[:2])
+        assert render(self.root, max_bytes=budget - 1) == lines[0]
+
+    def test_render_max_depth_does_not_touch_deeper_nodes(self):
+        class Exploding:
+            display = "boom"
+
+            @property
+            def children(self):
+                raise AssertionError("children should not be accessed")
+
+        root = TextRenderNode("root", [TextRenderNode("child", [Exploding()])])
+        assert render(root, max_depth=2) == "root\n└─ child\n   └─ boom\n"
+
+    def test_stats(self):
+        root = TextRenderNode("root", [TextRenderNode("ünï"), TextRenderNode("b")])
+        stats = Stats()
+        output = render(root, stats=stats)
+        assert stats.lines == 3
+        assert stats.bytes == len(output.encode("utf-8"))
+        assert "render" in stats.phase_seconds
+
+    def test_stats_counts_only_emitted_lines(self):
+        root = TextRenderNode("root", [TextRenderNode(str(i)) for i in range(10)])
+        stats = Stats()
+        lines = iter_render(root, stats=stats)
+        next(lines), next(lines)
+        lines.close()
+        assert stats.lines == 2
+
+    def test_compile_style(self):
+        glyphs = compile_style(solid_line_style, width=2, spacing=3)
+        assert glyphs.tee == "├──   "
+        assert glyphs.corner == "└──   "
+        assert glyphs.vline == "│     "
+        assert glyphs.blank == "      "
+        assert compile_style(solid_line_style, 2, 3) is glyphs
+
+
+class TestDeepTree:
+    depth = 100_000
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.root = node = TextRenderNode("0")
+        for i in range(1, self.depth):
+            child = TextRenderNode(str(i))
+            node.children.append(child)
+            node = child
+
+    def test_iter_render_deep_chain(self):
+        # A deep chain's output grows quadratically with depth, so only check
+        # a stretch well past the interpreter's recursion limit.
+        line_count = 5_000
+        lines = itertools.islice(iter_render(self.root), line_count)
+        assert next(lines) == "0\n"
+        for i, line in enumerate(lines, start=1):
+            assert line == " " * 3 * (i - 1) + "└─ " + str(i) + "\n"
+        assert i == line_count - 1
+
+    def test_streaming_memory_grows_with_depth(self):
+        # a line 5,000 levels down is ~15 KB; holding a prefix per level
+        # would take ~40 MB, one shared prefix only a few times the line
+        lines = itertools.islice(iter_render(self.root), 5_000)
+        tracemalloc.start()
+        try:
+            for _ in lines:
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 2_000_000
+
+
+class TestRenderCache:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.leaf = TextRenderNode("leaf")
+        self.branch = TextRenderNode("branch", [self.leaf])
+        self.sibling = TextRenderNode("sibling", [TextRenderNode("nephew")])
+        self.root = TextRenderNode("root", [self.branch, self.sibling])
+        self.cache = RenderCache()
+
+    def test_matches_render(self):
+        assert self.cache.render(self.root) == render(self.root)
+
+    def test_display_change(self):
+        self.cache.render(self.root)
+        self.leaf.display = "changed"
+        self.cache.invalidate(self.leaf)
+        assert self.cache.render(self.root) == render(self.root)
+
+    def test_unchanged_subtrees_are_reused(self):
+        self.cache.render(self.root)
+        sibling_lines = self.cache._lines[-2:]
+        self.branch.children.append(TextRenderNode("new"))
+        self.cache.invalidate(self.branch)
+        assert self.cache.render(self.root) == render(self.root)
+        # the sibling's lines are carried over, not drawn again
+        assert all(
+            old is new for old, new in zip(sibling_lines, self.cache._lines[-2:])
+        )
+
+    def test_reindented_subtree(self):
+        self.cache.render(self.root)
+        # the sibling stops being the last child, so its subtree's prefix
+        # changes, while the branch's lines stay as they are
+        branch_lines = self.cache._lines[1:3]
+        self.root.children.append(TextRenderNode("last"))
+        self.cache.invalidate(self.root)
+        assert self.cache.render(self.root) == render(self.root)
+        assert all(
+            old is new for old, new in zip(branch_lines, self.cache._lines[1:3])
+        )
+
+    @pytest.mark.parametrize("style", [solid_line_style, basic_style])
+    def test_random_changes(self, style):
+        random = __import__("random").Random(7)
+        cache = RenderCache(style)
+        nodes = [self.root, self.branch, self.leaf, self.sibling]
+        for step in range(300):
+            node = random.choice(nodes)
+            action = random.randrange(4)
+            if action == 0:
+                child = TextRenderNode(f"node_{step}")
+                node.children.insert(random.randint(0, len(node.children)), child)
+                nodes.append(child)
+                cache.invalidate(node)
+            elif action == 1 and node.children:
+                node.children.pop(random.randrange(len(node.children)))
+                cache.invalidate(node)
+            elif action == 2:
+                node.display = f"changed_{step}"
+                cache.invalidate(node)
+            if step % 3 == 0:
+                assert cache.render(self.root) == render(self.root, style)
+
+    def test_new_last_sibling(self):
+        self.cache.render(self.root)
+        self.root.children.append(TextRenderNode("last"))
+        self.cache.invalidate(self.root)
+        assert self.cache.render(self.root) == render(self.root)
+
+    def test_removed_subtrees_are_forgotten(self):
+        self.cache.render(self.root)
+        self.root.children.remove(self.branch)
+        self.cache.invalidate(self.root)
+        assert self.cache.render(self.root) == render(self.root)
+        assert id(self.branch) not in self.cache._entries
+        assert id(self.leaf) not in self.cache._entries
+
+    def test_moved_subtree(self):
+        self.cache.render(self.root)
+        self.branch.children.remove(self.leaf)
+        self.sibling.children.append(self.leaf)
+        self.cache.invalidate(self.branch, self.sibling)
+        assert self.cache.render(self.root) == render(self.root)
+        assert self.cache._parents[id(self.leaf)] is self.sibling
+
+    @pytest.mark.parametrize("style", [solid_line_style, clean_style, basic_style])
+    def test_styles(self, style):
+        cache = RenderCache(style, width=3, spacing=2)
+        expected = render(self.root, style=style, width=3, spacing=2)
+        assert cache.render(self.root) == expected
+
 
 if __name__ == "__main__":
     pytest.main()